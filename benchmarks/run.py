@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+"""Benchmark suite for the `pyjector` injection hot path.
+
+Measures the per-operation cost of:
+
+    - a bare call vs an `Injector.inject` wrapped call, with 0, 1, 5 and 20
+      injected arguments (generic and `compiled=True` wrappers).
+    - `Injector.register_callable` throughput.
+    - `Injector.__contains__` (by keyword and by object) on a large registry.
+    - `Injector.api` access on a large registry.
+    - provider construction with `functools.partial` init kwargs.
+
+Usage:
+
+    $ python benchmarks/run.py                          # print results
+    $ python benchmarks/run.py --json baseline.json     # save results
+    $ python benchmarks/run.py --compare baseline.json  # check regressions
+
+With `--compare` the script exits with status 1 if any benchmark is slower
+than the baseline by more than `--threshold` (default 10%).
+"""
+
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import platform
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pyjector import Injector  # noqa: E402
+
+
+REGISTRY_SIZE = 1000
+
+
+def _handler(count):
+    """Returns a function accepting `count` dependencies and an `x`
+    argument, along with the dependency names.
+    """
+    names = ['dep{}'.format(i) for i in range(count)]
+    namespace = {}
+    exec('def handler({}):\n    return x\n'.format(
+        ', '.join(names + ['x'])), namespace)
+    return namespace['handler'], names
+
+
+def bench_bare_call(count):
+    # Called the way the injected wrapper calls it: the dependencies
+    # positionally and `x` by keyword.
+    handler, names = _handler(count)
+    namespace = {'handler': handler}
+    exec('def bare():\n    return handler({})\n'.format(
+        ', '.join([repr(name) for name in names] + ['x=1'])), namespace)
+    return namespace['bare']
+
+
+def bench_inject_call(count, compiled=False):
+    handler, names = _handler(count)
+    injector = Injector()
+
+    for name in names:
+        injector[name] = name
+
+    if count:
+        wrapped = injector.inject(*names, compiled=compiled)(handler)
+    else:
+        wrapped = injector.inject(compiled=compiled)(handler)
+
+    return lambda: wrapped(x=1)
+
+
+def bench_register_callable():
+    state = {'injector': Injector(), 'count': 0}
+    factory = lambda: None  # noqa: E731
+
+    def _run():
+        if state['count'] == REGISTRY_SIZE:
+            state['injector'], state['count'] = Injector(), 0
+
+        state['injector'].register_callable(
+            factory, 'key{}'.format(state['count'])
+        )
+        state['count'] += 1
+
+    return _run
+
+
+def _large_injector():
+    injector = Injector()
+
+    for i in range(REGISTRY_SIZE):
+        injector['key{}'.format(i)] = object()
+
+    return injector
+
+
+def bench_contains_keyword():
+    injector = _large_injector()
+    keyword = 'key{}'.format(REGISTRY_SIZE - 1)
+    return lambda: keyword in injector
+
+
+def bench_contains_object():
+    injector = _large_injector()
+    obj = injector['key{}'.format(REGISTRY_SIZE - 1)]
+    return lambda: obj in injector
+
+
+def bench_api():
+    injector = _large_injector()
+    return lambda: injector.api
+
+
+def bench_partial_construction():
+    injector = Injector()
+    injector.register_callable(dict, 'config', scope='call', a=1, b=2, c=3)
+    return lambda: injector.get('config')
+
+
+def benchmarks():
+    """Returns the `(name, setup)` pairs of the suite, where `setup()`
+    returns the callable to time.
+    """
+    cases = []
+
+    for count in (0, 1, 5, 20):
+        cases.extend([
+            ('call_bare_{}'.format(count),
+             lambda c=count: bench_bare_call(c)),
+            ('call_inject_{}'.format(count),
+             lambda c=count: bench_inject_call(c)),
+            ('call_inject_compiled_{}'.format(count),
+             lambda c=count: bench_inject_call(c, compiled=True)),
+        ])
+
+    cases.extend([
+        ('register_callable', bench_register_callable),
+        ('contains_keyword_{}'.format(REGISTRY_SIZE), bench_contains_keyword),
+        ('contains_object_{}'.format(REGISTRY_SIZE), bench_contains_object),
+        ('api_{}'.format(REGISTRY_SIZE), bench_api),
+        ('partial_construction', bench_partial_construction),
+    ])
+
+    return cases
+
+
+def run(number, repeat, pattern=None):
+    """Runs the suite and returns a dict of benchmark name to nanoseconds
+    per operation (best of `repeat` runs).
+    """
+    results = {}
+
+    for name, setup in benchmarks():
+        if pattern and pattern not in name:
+            continue
+
+        best = min(timeit.repeat(setup(), number=number, repeat=repeat))
+        results[name] = best / number * 1e9
+
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Prints `results` against `baseline` and returns the names of the
+    benchmarks slower than the baseline by more than `threshold`.
+    """
+    regressions = []
+
+    for name in sorted(results):
+        current, previous = results[name], baseline.get(name)
+
+        if previous is None:
+            print('{:<32} {:>12.1f} ns  (new)'.format(name, current))
+            continue
+
+        change = (current - previous) / previous
+        flag = ''
+
+        if change > threshold:
+            regressions.append(name)
+            flag = '  REGRESSION'
+
+        print('{:<32} {:>12.1f} ns  {:>+7.1%}{}'.format(
+            name, current, change, flag))
+
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--number', type=int, default=20000,
+                        help='operations per timing run')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='timing runs per benchmark (best is kept)')
+    parser.add_argument('-k', dest='pattern',
+                        help='only run benchmarks whose name contains it')
+    parser.add_argument('--json', dest='output',
+                        help='write the results as JSON to this file')
+    parser.add_argument('--compare', dest='baseline',
+                        help='compare against a JSON results file')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='allowed slowdown ratio in --compare mode')
+    args = parser.parse_args(argv)
+
+    results = run(args.number, args.repeat, args.pattern)
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump({
+                'python': platform.python_version(),
+                'implementation': platform.python_implementation(),
+                'results': results,
+            }, output, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as baseline:
+            regressions = compare(results, json.load(baseline)['results'],
+                                  args.threshold)
+
+        if regressions:
+            print('\n{} regression(s): {}'.format(
+                len(regressions), ', '.join(regressions)))
+            return 1
+
+        return 0
+
+    for name in sorted(results):
+        print('{:<32} {:>12.1f} ns'.format(name, results[name]))
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
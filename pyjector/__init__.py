@@ -25,6 +25,7 @@ from __future__ import absolute_import
 __author__ = 'Papavassiliou Vassilis'
 __date__ = '2015-3-28'
 __version__ = '0.0.1'
-__all__ = ['InjectionError', 'Injector']
+__all__ = ['InjectionError', 'Injector', 'Scope', 'Singleton', 'ThreadLocal',
+           'ContextLocal', 'Pooled', 'Resource', 'Cached']
 
 from pyjector.pyjector import *
@@ -0,0 +1,273 @@
+# -*- coding: utf-8 -*-
+"""`pyjector._aio` module.
+
+Provides the `asyncio` support of `pyjector.Injector` (Python 3.5+).
+"""
+
+__author__ = 'Papavassiliou Vassilis'
+__date__ = '2015-3-28'
+__version__ = '0.0.1'
+
+import asyncio
+import contextlib
+import functools
+import inspect
+
+
+def future_factory(factory):
+    """Wraps an async `factory` so that calling it schedules the coroutine
+    as a task, which can be awaited any number of times once cached by a
+    provider scope.
+
+    Raises:
+        InjectionError, if called outside of a running event loop.
+    """
+
+    @functools.wraps(factory)
+    def _wrapped(**overrides):
+        if asyncio._get_running_loop() is None:
+            from pyjector.pyjector import InjectionError
+            raise InjectionError('Async provider `{}` requires a running '
+                                 'event loop'.format(
+                                     getattr(factory, '__name__', factory)))
+
+        return asyncio.ensure_future(factory(**overrides))
+
+    return _wrapped
+
+
+async def _await_all(kwargs, pending):
+    """Replaces the futures of `pending` keywords in `kwargs` with their
+    results, awaiting the unfinished ones concurrently.
+
+    Finished futures are read directly, as they may belong to an event loop
+    that is already closed (e.g. singletons constructed by `warm_up`).
+    """
+    unfinished = [kw for kw in pending if not kwargs[kw].done()]
+
+    if unfinished:
+        await asyncio.gather(*[kwargs[kw] for kw in unfinished])
+
+    for kw in pending:
+        kwargs[kw] = kwargs[kw].result()
+
+
+async def _release_all(acquired, error):
+    """Releases the `(provider, token)` pairs of `acquired` in reverse order,
+    awaiting async releases. The first release failure is raised after all
+    of them are released, unless the call itself failed.
+    """
+    failure = None
+
+    while acquired:
+        provider, token = acquired.pop()
+
+        try:
+            result = provider.release(token, error)
+
+            if provider.awaitable:
+                await result
+        except BaseException as exc:
+            failure = failure or exc
+
+    if failure is not None and error is None:
+        raise failure
+
+
+async def acquire_resource(factory, deps):
+    """Calls a `pyjector.Resource` async `factory` and enters the (async)
+    generator or context manager it returns.
+
+    Returns:
+        An `(instance, token)` tuple, the token is passed to
+        `release_resource`.
+    """
+    result = factory(**deps)
+
+    if inspect.isawaitable(result):
+        result = await result
+
+    if inspect.isasyncgen(result):
+        result = contextlib.asynccontextmanager(lambda: result)()
+    elif inspect.isgenerator(result):
+        result = contextlib.contextmanager(lambda: result)()
+
+    if hasattr(result, '__aenter__'):
+        return await result.__aenter__(), (result, True)
+
+    if hasattr(result, '__enter__'):
+        return result.__enter__(), (result, False)
+
+    return result, None
+
+
+async def release_resource(token, error):
+    """Exits the context manager entered by `acquire_resource`.
+    """
+    if token is None:
+        return
+
+    context, is_async = token
+    exc_info = (None, None, None) if error is None else \
+        (type(error), error, error.__traceback__)
+
+    if is_async:
+        await context.__aexit__(*exc_info)
+    else:
+        context.__exit__(*exc_info)
+
+
+def dependent_factory(factory, resolve):
+    """Returns an async factory that calls the async `factory` with the
+    dependencies returned by `resolve(overrides)`, awaiting async ones
+    concurrently.
+    """
+
+    @functools.wraps(factory)
+    async def _wrapped(**overrides):
+        kwargs = resolve(overrides)
+
+        await _await_all(kwargs, [kw for kw, value in kwargs.items()
+                                  if isinstance(value, asyncio.Future)])
+
+        return await factory(**kwargs)
+
+    return _wrapped
+
+
+def async_wrapper(callable_obj, plan, positions, injector, resolve):
+    """Returns an async wrapper injecting `plan` arguments in the coroutine
+    function `callable_obj`, except the ones supplied by the caller.
+
+    Values of async providers are awaited concurrently with `asyncio.gather`
+    before the coroutine function is called.
+    """
+    from pyjector.pyjector import _LEASED
+
+    cache = [None]
+
+    @functools.wraps(callable_obj)
+    async def __wrapped(*args, **kwargs):
+        resolution = cache[0]
+
+        if resolution is None or resolution.generation != injector.generation:
+            resolution = cache[0] = resolve(plan)
+
+        head, tail = resolution.bind(positions, len(args))[:2]
+        injected, leased = {}, set()
+
+        for kw, get, value in head + tail:
+            if kw in kwargs:
+                continue
+
+            if value is _LEASED:
+                leased.add(kw)
+            else:
+                injected[kw] = value if get is None else get()
+
+        if resolution.pending:
+            await _await_all(injected, [kw for kw in resolution.pending
+                                        if kw in injected])
+
+        kwargs.update(injected)
+
+        if not leased:
+            return await callable_obj(*args, **kwargs)
+
+        instances, acquired, error = {}, [], None
+
+        try:
+            for kw, provider, deps in resolution.needed(leased):
+                lease = provider.acquire(
+                    **dict((dep, instances[dep]) for dep in deps)
+                )
+
+                if provider.awaitable:
+                    lease = await lease
+
+                instances[kw], token = lease
+                acquired.append((provider, token))
+
+            for kw in leased:
+                kwargs[kw] = instances[kw]
+
+            return await callable_obj(*args, **kwargs)
+        except BaseException as exc:
+            error = exc
+            raise
+        finally:
+            await _release_all(acquired, error)
+
+    def _prepare():
+        if cache[0] is None or cache[0].generation != injector.generation:
+            cache[0] = resolve(plan)
+
+        for count in range(max(list(positions.values()) or [-1]) + 2):
+            cache[0].bind(positions, count)
+
+    __wrapped._pj_prepare = _prepare
+
+    return __wrapped
+
+
+def warm_up(order, dependencies, providers, construct, executor, timings):
+    """Constructs the providers of `order` in a new event loop, each one
+    after the providers it depends on. Async factories are awaited, sync
+    ones are run with `construct` in `executor`.
+    """
+    loop = asyncio.new_event_loop()
+
+    async def _construct(keyword, tasks):
+        await asyncio.gather(*[tasks[kw] for kw in dependencies(keyword)
+                               if kw in tasks])
+
+        if providers[keyword].awaitable:
+            start = loop.time()
+            await providers[keyword].get()
+            timings[keyword] = loop.time() - start
+        else:
+            await loop.run_in_executor(executor, construct, keyword)
+
+    async def _main():
+        tasks = {}
+
+        for keyword in order:
+            tasks[keyword] = loop.create_task(_construct(keyword, tasks))
+
+        await asyncio.gather(*tasks.values())
+
+    try:
+        loop.run_until_complete(_main())
+    finally:
+        loop.close()
+
+
+def timed_factory(factory, keyword, record):
+    """Wraps the async `factory` so that the time until its result is ready
+    is passed to `record(keyword, seconds)`.
+    """
+
+    @functools.wraps(factory)
+    async def _wrapped(**overrides):
+        loop = asyncio.get_event_loop()
+        start = loop.time()
+
+        try:
+            return await factory(**overrides)
+        finally:
+            record(keyword, loop.time() - start)
+
+    return _wrapped
+
+
+def counted_wrapper(wrapper, name, plan, record):
+    """Wraps the async injected `wrapper` so that its calls are passed to
+    `record(name, plan)`.
+    """
+
+    @functools.wraps(wrapper)
+    async def _wrapped(*args, **kwargs):
+        record(name, plan)
+        return await wrapper(*args, **kwargs)
+
+    return _wrapped
@@ -7,80 +7,2128 @@ Provides the main dependency-injection class implementation.
 __author__ = 'Papavassiliou Vassilis'
 __date__ = '2015-3-28'
 __version__ = '0.0.1'
-__all__ = ['InjectionError', 'Injector']
+__all__ = ['InjectionError', 'Injector', 'Scope', 'Singleton', 'ThreadLocal',
+           'ContextLocal', 'Pooled', 'Resource', 'Cached']
 
+import collections
+import contextlib
+import copy
 import functools
+import importlib
 import inspect
+import itertools
+import os
+import sys
+import threading
+import timeit
+import types
+import weakref
+
+try:
+    import contextvars
+except ImportError:  # pragma: no cover
+    contextvars = None
+
+try:
+    from types import MappingProxyType
+except ImportError:  # pragma: no cover
+    MappingProxyType = dict
+
+
+try:
+    _STRING_TYPES = (basestring,)  # noqa: F821
+except NameError:
+    _STRING_TYPES = (str,)
+
+_MISSING = object()
+_LEASED = object()
+_INJECTORS = weakref.WeakValueDictionary()
+_LIVE = weakref.WeakSet()
+
+
+def _argnames(callable_obj):
+    """Returns the argument names `callable_obj` accepts by keyword, in
+    declaration order.
+    """
+    try:
+        signature = inspect.signature
+    except AttributeError:  # pragma: no cover
+        return tuple(inspect.getargspec(callable_obj).args)
+
+    kinds = (inspect.Parameter.POSITIONAL_OR_KEYWORD,
+             inspect.Parameter.KEYWORD_ONLY)
+
+    return tuple(name for name, param in
+                 signature(callable_obj).parameters.items()
+                 if param.kind in kinds)
+
+
+def _positions(callable_obj, plan):
+    """Returns the index of the `plan` arguments `callable_obj` accepts
+    positionally.
+    """
+    try:
+        signature = inspect.signature
+    except AttributeError:  # pragma: no cover
+        args = inspect.getargspec(callable_obj).args
+        return dict((name, index) for index, name in enumerate(args)
+                    if name in plan)
+
+    positions = {}
+
+    try:
+        params = signature(callable_obj).parameters.values()
+    except (TypeError, ValueError):
+        return positions
+
+    for index, param in enumerate(params):
+        if param.kind not in (param.POSITIONAL_ONLY,
+                              param.POSITIONAL_OR_KEYWORD):
+            break
+
+        if param.name in plan:
+            positions[param.name] = index
+
+    return positions
+
+
+def _required_params(callable_obj):
+    """Returns the names of the arguments `callable_obj` requires and that
+    must thus be resolved by keyword.
+    """
+    try:
+        params = inspect.signature(callable_obj).parameters.values()
+    except (AttributeError, TypeError, ValueError):
+        return ()
+
+    return tuple(param.name for param in params
+                 if param.default is param.empty and
+                 param.kind not in (param.VAR_POSITIONAL, param.VAR_KEYWORD))
+
+
+def _provider_params(callable_obj):
+    """Returns the argument names of a provider factory that may be resolved
+    from the registry, i.e. the ones not already bound by `init_kwargs`.
+    """
+    try:
+        names = _argnames(callable_obj)
+    except (TypeError, ValueError):
+        return ()
+
+    bound = callable_obj.keywords \
+        if isinstance(callable_obj, functools.partial) else {}
+
+    return tuple(name for name in names if name not in bound)
+
+
+def _sort_graph(graph):
+    """Returns the keywords of a provider dependency `graph` in topological
+    order (dependencies first).
+
+    Raises:
+        InjectionError, if the graph contains a cycle.
+    """
+    order, done, path = [], set(), []
+
+    def _visit(keyword):
+        if keyword in done:
+            return
+
+        if keyword in path:
+            cycle = path[path.index(keyword):] + [keyword]
+            raise InjectionError('Circular provider dependency: {}'.format(
+                ' -> '.join(cycle)
+            ))
+
+        path.append(keyword)
+
+        for dependency in graph.get(keyword, ()):
+            _visit(dependency)
+
+        path.pop()
+        done.add(keyword)
+        order.append(keyword)
+
+    for keyword in sorted(graph):
+        _visit(keyword)
+
+    return tuple(order)
+
+
+def _wraps(wrapped):
+    """`functools.wraps` limited to the attributes `wrapped` has, which also
+    sets `__wrapped__` on Python 2, where partials have neither `__module__`
+    nor `__name__`.
+    """
+    assigned = tuple(attr for attr in functools.WRAPPER_ASSIGNMENTS
+                     if hasattr(wrapped, attr))
+
+    def _decorator(wrapper):
+        functools.update_wrapper(wrapper, wrapped, assigned)
+        wrapper.__wrapped__ = wrapped
+        return wrapper
+
+    return _decorator
+
+
+def _qualname(callable_obj):
+    """Returns the `module.qualname` of `callable_obj`, for reports.
+    """
+    return '{}.{}'.format(
+        getattr(callable_obj, '__module__', None),
+        getattr(callable_obj, '__qualname__',
+                getattr(callable_obj, '__name__', repr(callable_obj)))
+    )
+
+
+def _iscoroutinefunction(obj):
+    """Returns True if `obj` (or the function wrapped by a partial) is an
+    `async def` function.
+    """
+    while isinstance(obj, functools.partial):
+        obj = obj.func
+
+    check = getattr(inspect, 'iscoroutinefunction', None)
+
+    return check is not None and check(obj)
+
+
+def _import_string(path):
+    """Returns the object at the import string `path`, either
+    `'package.module:attr'` or `'package.module.attr'`.
+
+    Raises:
+        InjectionError, if the object cannot be imported.
+    """
+    module, _, attr = path.partition(':')
+
+    if not attr:
+        module, _, attr = path.rpartition('.')
+
+    try:
+        target = importlib.import_module(module)
+
+        for name in attr.split('.'):
+            target = getattr(target, name)
+    except (ImportError, AttributeError, ValueError) as error:
+        raise InjectionError('Cannot import `{}`: {}'.format(path, error))
+
+    return target
+
+
+class _ImportString(object):
+    """Callable registered for an import string: the object it names is
+    imported on first call (or public attribute access) and cached.
+    """
+
+    __slots__ = ('path', '_lock', '_target')
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._target = _MISSING
+
+    def load(self):
+        target = self._target
+
+        if target is _MISSING:
+            with self._lock:
+                if self._target is _MISSING:
+                    self._target = _import_string(self.path)
+                target = self._target
+
+        return target
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+
+    def __call__(self, *args, **kwargs):
+        return self.load()(*args, **kwargs)
+
+    def __getattr__(self, name):
+        # Private and special names are not forwarded, so that introspection
+        # (`inspect`, `functools.wraps`, ...) doesn't trigger the import.
+        if name.startswith('_'):
+            raise AttributeError(name)
+
+        return getattr(self.load(), name)
+
+    def __repr__(self):
+        return '<import {!r}>'.format(self.path)
+
+
+class _Chained(object):
+    """Read-only mapping over one registry dict of an injector hierarchy
+    (`field` 0 for the mapper, 1 for the providers), given the
+    `(mapper, providers)` pairs of its injectors from the child up.
+
+    A keyword resolves in the closest injector registering it. Lookups walk
+    the chain on a miss and memoise the keywords found, so that no registry
+    is copied; `keys` and `items` merge the chain on demand. The registry
+    dicts are never mutated in place, so the memo stays valid until the
+    chain is replaced (see `Injector.__resolved`).
+    """
+
+    __slots__ = ('levels', 'field', 'memo')
+
+    def __init__(self, levels, field):
+        self.levels = levels
+        self.field = field
+        self.memo = {}
+
+    def get(self, key, default=None):
+        try:
+            value = self.memo[key]
+        except KeyError:
+            value = _MISSING
+
+            for level in self.levels:
+                if key in level[0]:
+                    # Unregistered keys aren't memoised, as they may be
+                    # arbitrary objects (see `Injector.__contains__`).
+                    value = self.memo[key] = level[self.field].get(
+                        key, _MISSING)
+                    break
+
+        return default if value is _MISSING else value
+
+    def items(self):
+        merged = {}
+
+        for level in reversed(self.levels):
+            for key in level[0]:
+                merged[key] = level[self.field].get(key, _MISSING)
+
+        return [(key, value) for key, value in merged.items()
+                if value is not _MISSING]
+
+    def keys(self):
+        return [key for key, value in self.items()]
+
+    def __getitem__(self, key):
+        try:
+            value = self.memo[key]
+        except KeyError:
+            value = self.get(key, _MISSING)
+
+        if value is _MISSING:
+            raise KeyError(key)
+
+        return value
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.items())
+
+
+class _LazyProxy(object):
+    """Proxy injected for lazy dependencies: the dependency is resolved on
+    first use and every operation is forwarded to it.
+
+        Bound methods looked up through the proxy are stored on the proxy
+    itself, so repeated method calls skip the forwarding `__getattr__`.
+    """
+
+    __slots__ = ('_pj_get', '_pj_obj', '__dict__', '__weakref__')
+
+    def __init__(self, get):
+        object.__setattr__(self, '_pj_get', get)
+        object.__setattr__(self, '_pj_obj', _MISSING)
+
+    def _pj_resolve(self):
+        obj = self._pj_obj
+
+        if obj is _MISSING:
+            obj = self._pj_get()
+            object.__setattr__(self, '_pj_obj', obj)
+
+        return obj
+
+    def __getattr__(self, name):
+        value = getattr(self._pj_resolve(), name)
+
+        if inspect.ismethod(value) or inspect.isbuiltin(value):
+            self.__dict__[name] = value
+
+        return value
+
+    def __setattr__(self, name, value):
+        setattr(self._pj_resolve(), name, value)
+
+    def __delattr__(self, name):
+        delattr(self._pj_resolve(), name)
+
+    def __call__(self, *args, **kwargs):
+        return self._pj_resolve()(*args, **kwargs)
+
+    def __len__(self):
+        return len(self._pj_resolve())
+
+    def __iter__(self):
+        return iter(self._pj_resolve())
+
+    def __contains__(self, item):
+        return item in self._pj_resolve()
+
+    def __getitem__(self, key):
+        return self._pj_resolve()[key]
+
+    def __setitem__(self, key, value):
+        self._pj_resolve()[key] = value
+
+    def __delitem__(self, key):
+        del self._pj_resolve()[key]
+
+    def __bool__(self):
+        return bool(self._pj_resolve())
+
+    __nonzero__ = __bool__
+
+    def __eq__(self, other):
+        return self._pj_resolve() == other
+
+    def __ne__(self, other):
+        return self._pj_resolve() != other
+
+    def __hash__(self):
+        return hash(self._pj_resolve())
+
+    def __enter__(self):
+        return self._pj_resolve().__enter__()
+
+    def __exit__(self, *exc_info):
+        return self._pj_resolve().__exit__(*exc_info)
+
+    def __str__(self):
+        return str(self._pj_resolve())
+
+    def __repr__(self):
+        return '<lazy {!r}>'.format(self._pj_resolve())
+
+
+class _Resolution(object):
+    """Injection plan of a wrapper, resolved against one registry generation.
+
+    Plain registered objects are kept as constants, scoped providers as
+    bound `get` methods (or `_LazyProxy` constructors for `lazy` ones), and
+    leased providers (e.g. `Pooled`, `Resource`)
+    are acquired for each call, after the leased providers they depend on,
+    and released after it in reverse order.
+    """
+
+    __slots__ = ('generation', 'constants', 'getters', 'leases', 'injected',
+                 'pending', 'bindings')
+
+    def __init__(self, plan, view, generation, dependencies=None,
+                 lazy=()):
+        mapper, providers = view
+        constants, getters, injected, pending = {}, [], [], []
+
+        for kw in plan:
+            provider = providers.get(kw)
+
+            if provider is None:
+                constants[kw] = mapper[kw]
+            elif provider.leased:
+                injected.append(kw)
+            elif kw in lazy and not provider.awaitable:
+                getters.append((kw, functools.partial(_LazyProxy,
+                                                      provider.get)))
+            else:
+                getters.append((kw, provider.get))
+
+                if provider.awaitable:
+                    pending.append(kw)
+
+        leases, seen = [], set()
+
+        def _visit(kw):
+            if kw in seen:
+                return
+
+            seen.add(kw)
+            deps = tuple(dep for dep in dependencies(kw)
+                         if dep in providers and providers[dep].leased)
+
+            for dep in deps:
+                _visit(dep)
+
+            leases.append((kw, providers[kw], deps))
+
+        for kw in injected:
+            _visit(kw)
+
+        self.generation = generation
+        self.constants = constants
+        self.getters = tuple(getters)
+        self.leases = tuple(leases)
+        self.injected = tuple(injected)
+        self.pending = tuple(pending)
+        self.bindings = {}
+
+    def bind(self, positions, count):
+        """Returns the `(head, tail)` entries injecting the plan in a call
+        with `count` positional arguments, given the `positions` of the plan
+        arguments (see `_positions`).
+
+            `head` holds the arguments that directly follow the caller's
+        positional ones and are appended to them, `tail` the ones passed by
+        keyword. Arguments already filled by the positional ones are left
+        out. Entries are `(kw, get, value)` tuples: `get` is None for
+        constants, and `value` is `_LEASED` for leased arguments.
+
+            If all the entries are constants, the binding also holds their
+        values, as a tuple for the head and a dict for the tail, and `None`
+        otherwise.
+        """
+        binding = self.bindings.get(count)
+
+        if binding is not None:
+            return binding
+
+        entries = collections.OrderedDict()
+
+        for kw, value in self.constants.items():
+            entries[kw] = (kw, None, value)
+
+        for kw, get in self.getters:
+            entries[kw] = (kw, get, None)
+
+        for kw in self.injected:
+            entries[kw] = (kw, None, _LEASED)
+
+        head, position = [], count
+
+        for kw in sorted(positions, key=positions.get):
+            if kw not in entries:
+                continue
+
+            if positions[kw] < count:
+                del entries[kw]
+            elif positions[kw] == position:
+                head.append(entries.pop(kw))
+                position += 1
+
+        head, tail = tuple(head), tuple(entries.values())
+        constant = None
+
+        if all(get is None and value is not _LEASED
+               for kw, get, value in head + tail):
+            constant = (tuple(value for kw, get, value in head),
+                        dict((kw, value) for kw, get, value in tail))
+
+        binding = self.bindings[count] = (head, tail, constant)
+
+        return binding
+
+    def needed(self, keywords):
+        """Returns the `leases` entries to acquire for the leased `keywords`
+        (the ones the caller didn't supply): their own, and the ones of the
+        leased providers they depend on.
+        """
+        if len(keywords) == len(self.injected):
+            return self.leases
+
+        keep = set(keywords)
+
+        for kw, provider, deps in reversed(self.leases):
+            if kw in keep:
+                keep.update(deps)
+
+        return tuple(lease for lease in self.leases if lease[0] in keep)
+
+    def acquire(self, keywords=None):
+        """Acquires the leased values of `keywords` (default all of them), in
+        dependency order.
+
+        Returns:
+            A dict of the leased values and the list of `(provider, token)`
+            pairs to pass to `_release_all`.
+        """
+        instances, acquired = {}, []
+        leases = self.leases if keywords is None else self.needed(keywords)
+
+        try:
+            for kw, provider, deps in leases:
+                if provider.awaitable:
+                    raise InjectionError('`{}` requires an async injected '
+                                         'function'.format(kw))
+
+                instance, token = provider.acquire(
+                    **dict((dep, instances[dep]) for dep in deps)
+                )
+                instances[kw] = instance
+                acquired.append((provider, token))
+        except BaseException as exc:
+            _release_all(acquired, exc)
+            raise
+
+        return instances, acquired
+
+    def lease(self, invoke, keywords=None):
+        """Calls `invoke` with a dict of the leased values of `keywords`
+        (default all of them) and releases them afterwards in reverse order,
+        passing the exception raised by the call (if any) to their scope.
+        """
+        instances, acquired = self.acquire(keywords)
+        error = None
+
+        try:
+            return invoke(instances)
+        except BaseException as exc:
+            error = exc
+            raise
+        finally:
+            _release_all(acquired, error)
+
+    def call(self, callable_obj, args, kwargs, head, tail):
+        """Calls `callable_obj` with the `head` and `tail` entries of `bind`
+        injected, leasing the leased values for the duration of the call.
+        """
+        if not self.leases:
+            return _inject(callable_obj, args, kwargs, head, tail)
+
+        return self.lease(lambda instances: _inject(
+            callable_obj, args, kwargs, head, tail, instances
+        ), [kw for kw, get, value in head + tail if value is _LEASED])
+
+
+def _unsupplied(head, tail, kwargs):
+    """Returns the `head` and `tail` entries of `_Resolution.bind` without
+    the arguments the caller gave in `kwargs`. The head is cut before the
+    first of them, and the entries after the cut are passed by keyword.
+    """
+    for index, entry in enumerate(head):
+        if entry[0] in kwargs:
+            head, tail = head[:index], head[index:] + tail
+            break
+
+    return head, tuple(entry for entry in tail if entry[0] not in kwargs)
+
+
+def _inject(callable_obj, args, kwargs, head, tail, instances=None):
+    """Calls `callable_obj` with the values of the `head` entries appended to
+    `args` and the `tail` ones added to `kwargs`.
+    """
+    if head:
+        args += tuple([instances[kw] if value is _LEASED else
+                       value if get is None else get()
+                       for kw, get, value in head])
+
+    for kw, get, value in tail:
+        kwargs[kw] = instances[kw] if value is _LEASED else \
+            value if get is None else get()
+
+    return callable_obj(*args, **kwargs)
+
+
+def _release_all(acquired, error):
+    """Releases the `(provider, token)` pairs of `acquired` in reverse order.
+    All of them are released even if one fails; the first failure is raised
+    afterwards, unless the call itself failed.
+    """
+    failure = None
+
+    while acquired:
+        provider, token = acquired.pop()
+
+        try:
+            provider.release(token, error)
+        except BaseException as exc:
+            failure = failure or exc
+
+    if failure is not None and error is None:
+        raise failure
+
+
+def _call_batch(callable_obj, plan, positions, resolve, rows):
+    """Calls `callable_obj` for each argument tuple of `rows`, with `plan`
+    resolved, and its values constructed (or leased), once for all of them.
+
+    Returns:
+        The list of results.
+    """
+    resolution = resolve(plan)
+
+    def _run(instances):
+        values = dict(resolution.constants)
+        values.update((kw, get()) for kw, get in resolution.getters)
+        values.update(instances)
+        calls, results = {}, []
+
+        for args in rows:
+            call = calls.get(len(args))
+
+            if call is None:
+                head, tail = resolution.bind(positions, len(args))[:2]
+                call = calls[len(args)] = (
+                    tuple(values[entry[0]] for entry in head),
+                    dict((entry[0], values[entry[0]]) for entry in tail)
+                )
+
+            results.append(callable_obj(*(args + call[0]), **call[1]))
+
+        return results
+
+    if resolution.leases:
+        return resolution.lease(_run)
+
+    return _run({})
+
+
+def _importable(obj):
+    """Returns True if `obj` is reachable by its module and qualified name,
+    i.e. if pickle can save it by reference.
+    """
+    target = sys.modules.get(getattr(obj, '__module__', None))
+    qualname = getattr(obj, '__qualname__', getattr(obj, '__name__', ''))
+
+    for name in qualname.split('.'):
+        target = getattr(target, name, None)
+
+    return target is obj
+
+
+def _named_injector(name):
+    """Returns the injector named `name` in the current process, used to
+    unpickle injectors.
+    """
+    try:
+        return _INJECTORS[name]
+    except KeyError:
+        raise InjectionError('No injector named `{}`, the module creating it '
+                             'must be imported first'.format(name))
+
+
+def _reinjected(callable_obj, injector, keyword, options):
+    """Returns `callable_obj` injected again by `injector`, used to unpickle
+    `_Injected` wrappers.
+    """
+    return injector.inject(*keyword, **options)(callable_obj)
+
+
+class _Injected(object):
+    """Injected function whose undecorated function is importable, e.g.
+    `wrapped = injector.inject('db')(handler)`, so that pickle cannot save
+    the wrapper by reference under the function's name. Calls are forwarded
+    to the wrapper.
+
+        Pickled by reference to its own name if it is importable (e.g.
+    `handler = injector.inject('db')(handler)`), otherwise to the
+    undecorated function, the (named) injector and the `inject` arguments,
+    which inject the function again in the receiving process.
+    """
+
+    __slots__ = ('_call', '__dict__', '__weakref__')
+
+    def __init__(self, wrapper):
+        self._call = wrapper
+        functools.update_wrapper(self, wrapper)
+
+    def __call__(self, *args, **kwargs):
+        return self._call(*args, **kwargs)
+
+    def __get__(self, obj, cls=None):
+        # Bound like the function it stands for, e.g. as a method.
+        return self if obj is None else types.MethodType(self, obj)
+
+    def __reduce__(self):
+        if _importable(self):
+            return getattr(self, '__qualname__', self.__name__)
+
+        return _reinjected, self._pj_spec
+
+
+class _Batch(object):
+    """Runs the batch of an injected wrapper over rows, in this process or in
+    a pool. Pickled along with the wrapper, see `_Injected`.
+    """
+
+    __slots__ = ('wrapper',)
+
+    def __init__(self, wrapper):
+        self.wrapper = wrapper
+
+    def __call__(self, rows):
+        return self.wrapper._pj_batch(rows)
+
+    def __reduce__(self):
+        return _Batch, (self.wrapper,)
+
+
+def _call_rows(callable_obj, rows):
+    return [callable_obj(*args) for args in rows]
+
+
+def _map(batch, iterable, chunksize=1000, executor=None, prefetch=None):
+    """Yields the results of `batch` over the chunks of `iterable`, keeping
+    at most `prefetch` chunks in flight in `executor`.
+    """
+    iterator = iter(iterable)
+    chunks = iter(lambda: tuple(tuple(args) for args in
+                                itertools.islice(iterator, chunksize)), ())
+
+    if executor is None:
+        for chunk in chunks:
+            for result in batch(chunk):
+                yield result
+
+        return
+
+    if prefetch is None:
+        import multiprocessing
+        prefetch = 2 * multiprocessing.cpu_count()
+
+    pending = collections.deque()
+
+    for chunk in chunks:
+        pending.append(executor.submit(batch, chunk))
+
+        if len(pending) >= prefetch:
+            for result in pending.popleft().result():
+                yield result
+
+    while pending:
+        for result in pending.popleft().result():
+            yield result
+
+
+def _forget_failure(future, forget):
+    """Calls `forget()` if the `future` of an async factory fails or is
+    cancelled, so that the scope caching it constructs the instance again
+    on next use rather than raising the same error forever.
+    """
+    def _done(future):
+        if future.cancelled() or future.exception() is not None:
+            forget()
+
+    future.add_done_callback(_done)
+
+
+def _after_fork():
+    """Reinitialises every live injector in a child process after a fork.
+    """
+    locks, scopes = {}, {}
+
+    for injector in list(_LIVE):
+        injector._Injector__after_fork(locks, scopes)
+
+
+_UNRESOLVED = _Resolution((), ({}, {}), None, None)
+
+
+def _missing_argument(callable_obj, name):
+    raise TypeError('{}() missing required argument: {!r}'.format(
+        getattr(callable_obj, '__name__', 'callable'), name))
+
+
+def _compile_wrapper(callable_obj, plan, injector, resolve, static=False):
+    """Generates a wrapper with the exact parameter list of `callable_obj`,
+    and the injected values inlined in the call.
+
+        Injected arguments keep their place in the parameter list, with a
+    sentinel default, and are injected only if the caller doesn't supply
+    them, as in the generic wrapper. Required arguments following them get
+    the sentinel default too, and raise `TypeError` if missing.
+
+        The wrapper body is specialised against the current resolution of
+    `plan` (constants for plain objects, direct `get` calls for scoped
+    providers, acquire/release for leased ones) and regenerated in place
+    when the registry generation of `injector` changes. With `static=True`
+    (frozen injectors) the generation check is left out of the body.
+
+    Returns `None` if the signature of `callable_obj` cannot be compiled,
+    or if `callable_obj` is itself injected, since its signature (which
+    `inspect.signature` follows to the undecorated function) requires the
+    arguments it injects.
+    """
+    if hasattr(callable_obj, '_pj_site'):
+        return None
+
+    try:
+        params = inspect.signature(callable_obj).parameters.values()
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+    namespace = {'_pj_fn': callable_obj, '_pj_i': injector, '_pj_gen': None,
+                 '_pj_s': _MISSING, '_pj_missing': _missing_argument}
+    arg_src, forward_src, call_src, required = [], [], [], []
+    kwonly_marker, defaulted = True, False
+
+    for param in params:
+        name = param.name
+
+        if name.startswith('_pj_'):
+            return None
+
+        if param.kind in (param.VAR_POSITIONAL, param.VAR_KEYWORD):
+            star = '*' if param.kind == param.VAR_POSITIONAL else '**'
+            kwonly_marker = kwonly_marker and star == '**'
+            arg_src.append(star + name)
+            forward_src.append(star + name)
+            call_src.append((star + name, None))
+            continue
+
+        keyword_only = param.kind == param.KEYWORD_ONLY
+        template = name + '={}' if keyword_only else '{}'
+
+        if keyword_only and kwonly_marker:
+            kwonly_marker = False
+            arg_src.append('*')
+
+        if name in plan:
+            arg_src.append(name + '=_pj_s')
+        elif param.default is not param.empty:
+            namespace['_pj_d_' + name] = param.default
+            arg_src.append('{0}=_pj_d_{0}'.format(name))
+        elif defaulted and not keyword_only:
+            arg_src.append(name + '=_pj_s')
+            required.append(name)
+        else:
+            arg_src.append(name)
+
+        # A positional argument without default cannot follow one with it.
+        defaulted = defaulted or (not keyword_only and arg_src[-1] != name)
+        forward_src.append(template.format(name))
+        call_src.append((template, name))
+
+    filename = '<pyjector:{}>'.format(
+        getattr(callable_obj, '__name__', 'callable')
+    )
+    namespace['_pj_lock'] = threading.Lock()
+    # The generation of a child sums the ones of its ancestors.
+    current = ('_Injector__generation' if injector.parent is None else
+               'generation')
+
+    def _refresh():
+        with namespace['_pj_lock']:
+            if namespace['_pj_gen'] == injector.generation:
+                return
+
+            resolution = resolve(plan)
+            values = {}
+
+            for kw, value in resolution.constants.items():
+                namespace['_pj_c_' + kw] = value
+                values[kw] = '_pj_c_' + kw
+
+            for kw, get in resolution.getters:
+                namespace['_pj_g_' + kw] = get
+                values[kw] = '_pj_g_{}()'.format(kw)
+
+            body = ['def _pj_wrapper({}):'.format(', '.join(arg_src))]
+
+            if not static:
+                body.extend([
+                    '    if _pj_gen != _pj_i.{}:'.format(current),
+                    '        _pj_refresh()',
+                    '        return _pj_wrapper({})'.format(
+                        ', '.join(forward_src)),
+                ])
+
+            for name in required:
+                body.extend([
+                    '    if {} is _pj_s:'.format(name),
+                    '        _pj_missing(_pj_fn, {!r})'.format(name),
+                ])
+
+            for kw in plan:
+                if kw in values:
+                    body.extend([
+                        '    if {} is _pj_s:'.format(kw),
+                        '        {} = {}'.format(kw, values[kw]),
+                    ])
+
+            values = dict(
+                (kw, '(_pj_v[{0!r}] if {0} is _pj_s else {0})'.format(kw))
+                for kw in resolution.injected
+            )
+
+            call = '_pj_fn({})'.format(', '.join(
+                template.format(values.get(kw, kw)) if kw else template
+                for template, kw in call_src
+            ))
+
+            if resolution.leases:
+                namespace['_pj_r'] = resolution
+                namespace['_pj_l'] = resolution.injected
+                call = '_pj_r.lease(lambda _pj_v: {}, [_pj_k for _pj_k, ' \
+                    '_pj_a in zip(_pj_l, ({},)) if _pj_a is _pj_s])'.format(
+                        call, ', '.join(resolution.injected))
+
+            body.append('    return ' + call)
+
+            code = compile('\n'.join(body) + '\n', filename, 'exec')
+
+            if '_pj_wrapper' in namespace:
+                # Swap the code of the existing function object, so that the
+                # wrapper handed out to callers stays the same.
+                scratch = dict(namespace)
+                exec(code, scratch)
+                namespace['_pj_wrapper'].__code__ = \
+                    scratch['_pj_wrapper'].__code__
+            else:
+                exec(code, namespace)
+
+            namespace['_pj_gen'] = resolution.generation
+
+    namespace['_pj_refresh'] = _refresh
+    _refresh()
+
+    def _reinit():
+        namespace['_pj_lock'] = threading.Lock()
+
+    # The hooks are set after `wraps`, which copies the `__dict__` of
+    # `callable_obj` (e.g. the hooks of an inner injected function).
+    wrapper = functools.wraps(callable_obj)(namespace['_pj_wrapper'])
+    wrapper._pj_prepare = _refresh
+    wrapper._pj_after_fork = _reinit
+
+    return wrapper
 
 
 class InjectionError(Exception):
     """Base Exception class.
     """
-    pass
+    pass
+
+
+class Scope(object):
+    """Base provider scope.
+
+    A scope is bound to a registered factory and decides when the factory is
+    called to produce the object that gets injected. The base scope calls the
+    factory on every resolution.
+
+    Async factories are scheduled as tasks; the scope caches the task and
+    async injected functions await it before the call.
+
+        Scopes created with `fork_safe=False` (e.g. for sockets, locks or
+    thread pools) drop their instances in child processes after a fork, as
+    do the scopes of the providers depending on them, see
+    `Injector.fork_unsafe`.
+
+    Args:
+        fork_safe (bool): Whether cached instances may be shared with forked
+            child processes (default True).
+    """
+
+    __slots__ = ('factory', 'awaitable', 'fork_safe')
+
+    #: Leased scopes lend an instance for the duration of each injected call
+    #: through `acquire(**deps)`, returning an `(instance, token)` tuple, and
+    #: `release(token, error)` instead of `get`.
+    leased = False
+
+    #: Parameterised scopes accept factory arguments in `get(**params)`.
+    parameterised = True
+
+    def __init__(self, fork_safe=True):
+        self.factory = None
+        self.awaitable = False
+        self.fork_safe = fork_safe
+        self.reset()
+
+    def bind(self, factory):
+        """Returns a copy of the scope bound to `factory`.
+        """
+        bound = copy.copy(self)
+        bound.awaitable = _iscoroutinefunction(factory)
+
+        if bound.awaitable:
+            from pyjector._aio import future_factory
+            factory = future_factory(factory)
+
+        bound.factory = factory
+        bound.reset()
+        return bound
+
+    def rebind(self, factory):
+        """Returns a copy of the scope bound to `factory`, keeping the
+        instances the scope already holds where it can share them.
+        """
+        return self.bind(factory)
+
+    def reset(self):
+        """Drops any instance cached by the scope.
+        """
+        pass
+
+    def after_fork(self, drop):
+        """Called in a child process after a fork, with `drop` True if the
+        cached instances must be dropped. Also recreates the scope locks,
+        which may have been held by other threads of the parent.
+        """
+        if drop:
+            self.reset()
+
+    def get(self, **params):
+        """Returns the object to inject, constructed with the factory
+        arguments `params` if given.
+        """
+        return self.factory(**params)
+
+
+class Singleton(Scope):
+    """Scope that constructs its instance once, on first use, and injects the
+    same instance thereafter.
+
+        Instances constructed with arguments (see `Injector.get`) are
+    memoised per argument set, keeping the `maxvariants` most recently used
+    ones, and constructed once per argument set under concurrent use too
+    (see `Cached`).
+    """
+
+    __slots__ = ('_lock', '_instance', '_variants')
+
+    maxvariants = 128
+
+    def reset(self):
+        self._lock = threading.Lock()
+        self._instance = _MISSING
+        self._variants = None
+
+    def rebind(self, factory):
+        bound = self.bind(factory)
+        bound._instance = self._instance
+        return bound
+
+    def after_fork(self, drop):
+        if drop:
+            self.reset()
+        else:
+            self._lock = threading.Lock()
+
+            if self._variants is not None:
+                self._variants.after_fork(drop)
+
+    def get(self, **params):
+        if params:
+            return self._cached_variants().get(**params)
+
+        instance = self._instance
+
+        if instance is _MISSING:
+            with self._lock:
+                if self._instance is _MISSING:
+                    self._instance = self.factory()
+
+                    if self.awaitable:
+                        _forget_failure(self._instance, functools.partial(
+                            self._forget, self._instance))
+                instance = self._instance
+
+        return instance
+
+    def _forget(self, instance):
+        with self._lock:
+            if self._instance is instance:
+                self._instance = _MISSING
+
+    def _cached_variants(self):
+        variants = self._variants
+
+        if variants is None:
+            with self._lock:
+                if self._variants is None:
+                    cached = Cached(maxsize=self.maxvariants)
+                    cached.factory = self.factory
+                    cached.awaitable = self.awaitable
+                    self._variants = cached
+                variants = self._variants
+
+        return variants
+
+
+class ThreadLocal(Scope):
+    """Scope that constructs one instance per thread, on first use in that
+    thread.
+    """
+
+    __slots__ = ('_local',)
+
+    parameterised = False
+
+    def reset(self):
+        self._local = threading.local()
+
+    def get(self):
+        local = self._local
+
+        try:
+            return local.instance
+        except AttributeError:
+            local.instance = instance = self.factory()
+            return instance
+
+
+class ContextLocal(Scope):
+    """Scope that constructs one instance per `contextvars` context, which
+    means one instance per `asyncio` task.
+
+    Requires Python 3.7+.
+    """
+
+    __slots__ = ('_var',)
+
+    parameterised = False
+
+    def reset(self):
+        if contextvars is None:  # pragma: no cover
+            raise InjectionError('`context` scope requires contextvars')
+
+        self._var = contextvars.ContextVar('pyjector', default=_MISSING)
+
+    def get(self):
+        instance = self._var.get()
+
+        if instance is _MISSING:
+            instance = self.factory()
+            self._var.set(instance)
+
+        return instance
+
+
+class Pooled(Scope):
+    """Scope that lends instances from a bounded pool to injected functions,
+    for the duration of each call.
+
+        Instances are created by the factory on demand, up to `maxsize`. When
+    all of them are in use, callers block until one is released, or until
+    `timeout` seconds pass, in which case `InjectionError` is raised. If a
+    `check` callable is given, idle instances are health-checked on
+    checkout and replaced if `check(instance)` returns False.
+
+    Args:
+        maxsize (int): Maximum number of instances (default 10).
+        timeout (float): Seconds to wait for an instance (default None,
+            waits forever).
+        check (callable): Health-check called on checkout (default None).
+        fork_safe (bool): See `Scope`. The pool is emptied in child processes
+            after a fork either way, as the instances lent to other threads of
+            the parent are never returned there.
+    """
+
+    __slots__ = ('maxsize', 'timeout', 'check', '_cond', '_idle', '_size',
+                 '_in_use', '_waits', '_wait_time')
+
+    leased = True
+
+    def __init__(self, maxsize=10, timeout=None, check=None,
+                 fork_safe=True):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self.check = check
+        Scope.__init__(self, fork_safe)
+
+    def reset(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._idle = collections.deque()
+        self._size = 0
+        self._in_use = 0
+        self._waits = 0
+        self._wait_time = 0.0
+
+    def after_fork(self, drop):
+        self.reset()
+
+    def bind(self, factory):
+        if _iscoroutinefunction(factory):
+            raise InjectionError('Pooled scope requires a sync factory')
+
+        return Scope.bind(self, factory)
+
+    def acquire(self, **deps):
+        """Checks out an instance, creating it if the pool is not full.
+
+        Returns:
+            An `(instance, token)` tuple, the token is passed to `release`.
+        """
+        instance, start = _MISSING, None
+
+        with self._cond:
+            while not self._idle and self._size >= self.maxsize:
+                now = timeit.default_timer()
+
+                if start is None:
+                    start = now
+
+                remaining = None if self.timeout is None \
+                    else self.timeout - (now - start)
+
+                if remaining is not None and remaining <= 0:
+                    self._waits += 1
+                    self._wait_time += now - start
+                    raise InjectionError('Timed out waiting for a pooled '
+                                         'instance')
+
+                self._cond.wait(remaining)
+
+            if self._idle:
+                instance = self._idle.pop()
+            else:
+                self._size += 1
+
+            self._in_use += 1
+
+            if start is not None:
+                self._waits += 1
+                self._wait_time += timeit.default_timer() - start
+
+        try:
+            if instance is _MISSING or \
+                    (self.check is not None and not self.check(instance)):
+                instance = self.factory(**deps)
+        except BaseException:
+            with self._cond:
+                self._size -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+        return instance, instance
+
+    def release(self, instance, error=None):
+        """Returns a checked out instance to the pool.
+        """
+        with self._cond:
+            self._idle.append(instance)
+            self._in_use -= 1
+            self._cond.notify()
+
+    def stats(self):
+        """Returns the pool metrics: `size`, `in_use`, `idle`, `waits` and
+        cumulative `wait_time` in seconds.
+        """
+        with self._cond:
+            return {
+                'size': self._size,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'waits': self._waits,
+                'wait_time': self._wait_time,
+            }
+
+
+class Resource(Scope):
+    """Scope that constructs a new instance per injected call and finalises
+    it after the call, even if the call raises.
+
+        The factory may be a generator function, whose single yielded value
+    is injected and which is resumed after the call, or return a context
+    manager, which is entered before and exited after the call. Async
+    generator functions and async context managers are supported for async
+    injected functions. The exception raised by the call, if any, is thrown
+    into the generator / passed to `__exit__`.
+    """
+
+    __slots__ = ()
+
+    leased = True
+
+    def bind(self, factory):
+        bound = copy.copy(self)
+        target = factory
+
+        while hasattr(target, '__wrapped__'):
+            target = target.__wrapped__
+
+        isasyncgen = getattr(inspect, 'isasyncgenfunction', lambda obj: False)
+        bound.awaitable = _iscoroutinefunction(factory) or isasyncgen(target)
+        bound.factory = factory
+        return bound
+
+    def acquire(self, **deps):
+        if self.awaitable:
+            from pyjector._aio import acquire_resource
+            return acquire_resource(self.factory, deps)
+
+        result = self.factory(**deps)
+
+        if inspect.isgenerator(result):
+            result = contextlib.contextmanager(lambda: result)()
+
+        if hasattr(result, '__enter__') and hasattr(result, '__exit__'):
+            return result.__enter__(), result
+
+        return result, None
+
+    def release(self, token, error=None):
+        if self.awaitable:
+            from pyjector._aio import release_resource
+            return release_resource(token, error)
+
+        if token is not None:
+            if error is None:
+                token.__exit__(None, None, None)
+            else:
+                token.__exit__(type(error), error, error.__traceback__
+                               if hasattr(error, '__traceback__') else None)
+
+
+class _Flight(object):
+    """Construction of a cached instance in progress, whose result the
+    concurrent callers needing the same instance wait for.
+    """
+
+    __slots__ = ('_done', '_instance', '_error')
+
+    def __init__(self):
+        self._done = threading.Event()
+        self._instance = self._error = None
+
+    def finish(self, instance=None, error=None):
+        self._instance, self._error = instance, error
+        self._done.set()
+
+    def result(self):
+        self._done.wait()
+
+        if self._error is not None:
+            raise self._error
+
+        return self._instance
+
+
+class Cached(Scope):
+    """Scope that caches its instances for `ttl` seconds, evicting the least
+    recently used ones beyond `maxsize`.
+
+        Instances are keyed by the arguments `get` is called with (see
+    `Injector.get`), so parameterised providers cache one instance per
+    argument set. Missing or expired instances are constructed again on
+    first use, once: concurrent callers wait for that construction (and get
+    its error, if it fails) instead of calling the factory too. With
+    `refresh_ahead`, an instance used during the last `refresh_ahead`
+    seconds of its lifetime is constructed again in a background thread
+    (or task, for async factories), while callers keep getting the current
+    one, so that under steady use they never wait on an expiry.
+
+    Args:
+        ttl (float): Seconds instances are kept (default None, until
+            evicted).
+        maxsize (int): Maximum number of cached instances (default 128).
+        refresh_ahead (float): Seconds before expiry from which instances
+            are refreshed in the background (default None, no refresh).
+        fork_safe (bool): See `Scope`.
+    """
+
+    __slots__ = ('ttl', 'maxsize', 'refresh_ahead', '_lock', '_entries',
+                 '_flights', '_refreshing', '_hits', '_misses', '_evictions',
+                 '_refreshes')
+
+    #: The monotonic clock used for expiry.
+    clock = staticmethod(timeit.default_timer)
+
+    def __init__(self, ttl=None, maxsize=128, refresh_ahead=None,
+                 fork_safe=True):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.refresh_ahead = refresh_ahead
+        Scope.__init__(self, fork_safe)
+
+    def reset(self):
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()
+        self._flights = {}
+        self._refreshing = set()
+        self._hits = self._misses = self._evictions = self._refreshes = 0
+
+    def rebind(self, factory):
+        bound = self.bind(factory)
+
+        with self._lock:
+            bound._entries.update(self._entries)
+
+        return bound
+
+    def after_fork(self, drop):
+        if drop:
+            self.reset()
+        else:
+            self._lock = threading.Lock()
+            self._flights = {}
+            self._refreshing = set()
+
+    def get(self, **params):
+        key = tuple(sorted(params.items()))
+        now = self.clock()
+        refresh = owner = False
+
+        with self._lock:
+            entry = self._entries.pop(key, None)
+
+            if entry is not None and (entry[1] is None or now < entry[1]):
+                self._entries[key] = entry
+                self._hits += 1
+
+                if self.refresh_ahead is not None and \
+                        entry[1] is not None and \
+                        now >= entry[1] - self.refresh_ahead and \
+                        key not in self._refreshing:
+                    self._refreshing.add(key)
+                    self._refreshes += 1
+                    refresh = True
+            else:
+                entry = None
+                self._misses += 1
+                flight = self._flights.get(key)
+
+                if flight is None:
+                    flight = self._flights[key] = _Flight()
+                    owner = True
+
+        if refresh:
+            self._refresh(key, params)
+
+        if entry is not None:
+            return entry[0]
+
+        if not owner:
+            return flight.result()
+
+        try:
+            instance = self.factory(**params)
+        except BaseException as error:
+            with self._lock:
+                self._flights.pop(key, None)
+
+            flight.finish(error=error)
+            raise
+
+        self._store(key, instance, flight)
+        flight.finish(instance)
+
+        if self.awaitable:
+            _forget_failure(instance, functools.partial(self._forget, key,
+                                                        instance))
+
+        return instance
+
+    def _store(self, key, instance, flight=None):
+        expiry = None if self.ttl is None else self.clock() + self.ttl
+
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (instance, expiry)
+            self._refreshing.discard(key)
+
+            if flight is not None:
+                self._flights.pop(key, None)
+
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def _forget(self, key, instance):
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is not None and entry[0] is instance:
+                del self._entries[key]
+
+    def _refresh(self, key, params):
+        """Constructs the instance of `key` again without blocking, keeping
+        the current one if the construction fails.
+        """
+        if self.awaitable:
+            self.factory(**params).add_done_callback(
+                lambda future: self._refreshed(key, future if not (
+                    future.cancelled() or future.exception()) else _MISSING)
+            )
+            return
+
+        def _run():
+            try:
+                instance = self.factory(**params)
+            except Exception:
+                instance = _MISSING
+
+            self._refreshed(key, instance)
+
+        thread = threading.Thread(target=_run, name='pyjector-refresh')
+        thread.daemon = True
+        thread.start()
+
+    def _refreshed(self, key, instance):
+        if instance is _MISSING:
+            with self._lock:
+                self._refreshing.discard(key)
+        else:
+            self._store(key, instance)
+
+    def stats(self):
+        """Returns the cache metrics: `size`, `hits`, `misses`, `evictions`
+        and `refreshes`.
+        """
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'hits': self._hits,
+                'misses': self._misses,
+                'evictions': self._evictions,
+                'refreshes': self._refreshes,
+            }
+
+
+_SCOPES = {
+    'call': Scope,
+    'singleton': Singleton,
+    'thread': ThreadLocal,
+    'context': ContextLocal,
+    'pooled': Pooled,
+    'resource': Resource,
+    'cached': Cached,
+}
+
+
+def _make_scope(scope, factory):
+    """Returns `scope` (a scope name or `Scope` instance) bound to `factory`.
+    """
+    if isinstance(scope, Scope):
+        return scope.bind(factory)
+
+    try:
+        return _SCOPES[scope]().bind(factory)
+    except (KeyError, TypeError):
+        raise InjectionError('Invalid scope: {!r}'.format(scope))
+
+
+class _Histogram(object):
+    """Fixed-size histogram of durations, with power-of-two microsecond
+    buckets.
+    """
+
+    __slots__ = ('buckets',)
+
+    size = 32
+
+    def __init__(self):
+        self.buckets = [0] * self.size
+
+    def add(self, seconds):
+        micros = int(seconds * 1e6)
+        self.buckets[min(micros.bit_length(), self.size - 1)] += 1
+
+    def percentile(self, q):
+        """Returns the upper bound (in seconds) of the bucket holding the
+        `q` percentile, or `None` if the histogram is empty.
+        """
+        total = sum(self.buckets)
+
+        if not total:
+            return None
+
+        rank, seen = total * q / 100.0, 0
+
+        for index, count in enumerate(self.buckets):
+            seen += count
+
+            if seen >= rank:
+                return (1 << index) / 1e6
+
+
+class _Stats(object):
+    """Injection statistics recorded by an instrumented `Injector`.
+    """
+
+    __slots__ = ('_lock', '_providers', '_functions')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._providers = {}
+        self._functions = {}
+
+    def __provider(self, keyword):
+        record = self._providers.get(keyword)
+
+        if record is None:
+            record = self._providers[keyword] = [0, 0, 0.0, _Histogram()]
+
+        return record
+
+    def resolved(self, keywords):
+        with self._lock:
+            for keyword in keywords:
+                self.__provider(keyword)[0] += 1
+
+    def called(self, name, keywords):
+        with self._lock:
+            self._functions[name] = self._functions.get(name, 0) + 1
+
+            for keyword in keywords:
+                self.__provider(keyword)[0] += 1
+
+    def constructed(self, keyword, seconds):
+        with self._lock:
+            record = self.__provider(keyword)
+            record[1] += 1
+            record[2] += seconds
+            record[3].add(seconds)
+
+    def timed(self, keyword, factory):
+        """Wraps a provider `factory` so that its constructions are recorded.
+        """
+        if _iscoroutinefunction(factory):
+            from pyjector._aio import timed_factory
+            return timed_factory(factory, keyword, self.constructed)
+
+        @functools.wraps(factory)
+        def _timed(**overrides):
+            start = timeit.default_timer()
+
+            try:
+                return factory(**overrides)
+            finally:
+                self.constructed(keyword, timeit.default_timer() - start)
+
+        return _timed
+
+    def counted(self, callable_obj, wrapper, plan):
+        """Wraps an injected function `wrapper` so that its calls are
+        recorded.
+        """
+        name = _qualname(callable_obj)
+
+        if _iscoroutinefunction(wrapper):
+            from pyjector._aio import counted_wrapper
+            return counted_wrapper(wrapper, name, plan, self.called)
+
+        @functools.wraps(wrapper)
+        def _counted(*args, **kwargs):
+            self.called(name, plan)
+            return wrapper(*args, **kwargs)
+
+        return _counted
+
+    def snapshot(self):
+        with self._lock:
+            providers = dict(
+                (keyword, {
+                    'resolutions': record[0],
+                    'constructions': record[1],
+                    'total_time': record[2],
+                    'p50': record[3].percentile(50),
+                    'p90': record[3].percentile(90),
+                    'p99': record[3].percentile(99),
+                })
+                for keyword, record in self._providers.items()
+            )
+
+            return {'providers': providers,
+                    'functions': dict(self._functions)}
+
+
+class Injector(object):
+    """Main Injection class that can help implement DP pattern.
+
+    `pyjector.Injector` class is a helper class for implementing the well-known
+    `Dependency-Injection` pattern. Provides a user-friendly decorator API for
+    injecting callables (functions or classes) into any function/class/methods
+    you want.
+
+    Features:
+        - Register callables with aliases in injector (decorated, or method).
+        - Dict-like access in registered callables.
+        - Partial Wrap callables registered in injector instances..
+        - Doesn't affect callables that don't require specific dependency.
+
+    Examples:
+
+            >>> injector = Injector()
+            >>>
+            >>> @injector.provider('days')
+            ... def days_function():
+            ...     return 365
+            ...
+            >>> @injector.inject('days')
+            ... def days_handler(days, year=1):
+            ...     return days(), year
+            ...
+            >>> print days_handler(year=3)
+            (365, 3)
+
+    .. note :: Using the decorator syntax or not, you must be ware of the
+    relative path imports in your code. In the docs tutorial we describe a
+    proper way of creating dependencies in a modular way, that your api can
+    be tested independently from other parts of code.
+
+    """
+
+    __slots__ = ('__mapper', '__index', '__providers', '__params', '__graph',
+                 '__parent', '__view', '__generation', '__stats', '__frozen',
+                 '__lock', '__snapshots', '__name', '__sites', '__weakref__')
+
+    version = tuple(map(int, __version__.split('.')))
+    snapshot_limit = 16
+
+    def __init__(self, parent=None, instrument=False, name=None):
+        self.__mapper = {}
+        self.__index = {}
+        self.__providers = {}
+        self.__params = {}
+        self.__graph = None
+        self.__parent = parent
+        self.__view = None if parent else (self.__mapper, self.__providers)
+        self.__generation = 0
+        self.__stats = _Stats() if instrument else None
+        self.__frozen = False
+        self.__lock = parent.__lock if parent else threading.RLock()
+        self.__snapshots = collections.OrderedDict()
+        self.__name = name
+        self.__sites = weakref.WeakSet()
+
+        if parent is not None:
+            self.__stats = parent.__stats
+
+        if name is not None:
+            _INJECTORS[name] = self
+
+        _LIVE.add(self)
+
+    @property
+    def api(self):
+        """Returns Injector instance registered callables aliases.
+        """
+        return list(self.__resolved()[0].keys())
+
+    @property
+    def parent(self):
+        """Returns the parent injector of a child injector, or `None`.
+        """
+        return self.__parent
+
+    @property
+    def generation(self):
+        """Returns a counter that changes whenever the injector, or any of
+        its ancestors, is mutated.
+        """
+        generation, injector = self.__generation, self.__parent
+
+        while injector is not None:
+            generation += injector.__generation
+            injector = injector.__parent
+
+        return generation
+
+    def stats(self):
+        """Returns a snapshot of the injection statistics of an instrumented
+        injector (`Injector(instrument=True)`), or `None`.
+
+            Instrumentation is chosen when the injector is created, so that
+        uninstrumented injectors run the plain wrappers and factories. An
+        instrumented injector records, per keyword, how often it's resolved
+        and constructed, the cumulative construction time and its 50/90/99
+        percentiles (upper bounds of a power-of-two microsecond histogram),
+        and per `inject`-decorated function how often it's called. Child
+        injectors share the statistics of their parent.
+
+        Returns:
+            A dict with `providers` and `functions` entries.
+        """
+        if self.__stats is not None:
+            return self.__stats.snapshot()
+
+    @property
+    def name(self):
+        """Returns the name the injector is pickled by, or None.
+
+            Named injectors (`Injector(name='app')`) are pickled by reference
+        to their name, and unpickled as the injector of the same name in the
+        receiving process, e.g. the one created when a worker process imports
+        the module defining it. Its providers are thus constructed lazily in
+        the worker. The last injector created with a name wins.
+        """
+        return self.__name
+
+    @property
+    def frozen(self):
+        """Returns True for read-only injectors created by `freeze`.
+        """
+        return self.__frozen
+
+    def freeze(self):
+        """Returns a frozen, read-only copy of the injector.
+
+            The frozen injector holds the flattened registry (parent entries
+        included) in `types.MappingProxyType` views, and raises
+        `InjectionError` on any mutation. Its providers are copies of the
+        original scopes, rebound to resolve their dependencies from the
+        frozen registry, so later changes to the original don't reach them;
+        singleton and cached instances already constructed are shared.
+        Since it never changes, its `inject` wrappers are compiled by
+        default, with the injected objects resolved once and bound as
+        constants, and without any registry check on the call path; reads
+        need no locking.
+
+        Returns:
+            A new, frozen `Injector` instance.
+
+        Raises:
+            InjectionError, if the provider dependencies form a cycle.
+        """
+        mapper, providers = self.__resolved()
+        edges = dict((keyword, self.dependencies(keyword))
+                     for keyword in providers)
+
+        frozen = type(self)()
+        frozen.__stats = self.__stats
+        frozen.__params = edges
+        rebound = {}
+
+        for keyword, provider in providers.items():
+            factory = frozen.__provider_factory(keyword, mapper[keyword])
+
+            if frozen.__stats is not None:
+                factory = frozen.__stats.timed(keyword, factory)
+
+            rebound[keyword] = provider.rebind(factory)
+
+        frozen.__mapper = MappingProxyType(dict(mapper))
+        frozen.__providers = MappingProxyType(rebound)
+        frozen.__view = (frozen.__mapper, frozen.__providers)
+        frozen.__graph = (0, edges, _sort_graph(edges))
+        frozen.__frozen = True
+
+        for key, value in mapper.items():
+            frozen.__index.setdefault(id(value), []).append(key)
+
+        return frozen
+
+    def snapshot(self):
+        """Records the current state of the registry and returns its
+        generation, to be restored later with `rollback`.
+
+            The registry dicts are never mutated in place (see
+        `register_callable`), so a snapshot costs no copy. The last
+        `snapshot_limit` snapshots are kept. Entries inherited from a parent
+        injector are not part of the snapshot.
+
+        Returns:
+            The generation (int) identifying the snapshot.
+
+        Examples:
+
+            >>> injector = Injector()
+            >>> injector['token'] = 'old'
+            >>> generation = injector.snapshot()
+            >>> injector['token'] = 'new'
+            >>> injector.rollback(generation)
+            >>> injector['token']
+            'old'
+        """
+        with self.__lock:
+            generation = self.generation
+            snapshots = self.__snapshots
+            snapshots.pop(generation, None)
+            snapshots[generation] = (self.__mapper, self.__providers,
+                                     self.__params)
+
+            while len(snapshots) > self.snapshot_limit:
+                snapshots.popitem(last=False)
+
+            return generation
+
+    def rollback(self, generation):
+        """Atomically restores the registry recorded by `snapshot`.
+
+            Scoped providers are restored along with the instances they hold.
+        Injected calls already in flight complete with the dependencies they
+        were given. The rollback is itself a mutation: `generation` changes
+        again, and the restored snapshot remains available.
+
+        Args:
+            generation (int): The value returned by `snapshot`.
+
+        Raises:
+            InjectionError, if no snapshot of `generation` is kept, or if the
+            injector is frozen.
+        """
+        with self.__lock:
+            self.__check_mutable()
+
+            try:
+                mapper, providers, params = self.__snapshots[generation]
+            except KeyError:
+                raise InjectionError('No snapshot of generation {}'
+                                     .format(generation))
+
+            index = {}
+
+            for key, value in mapper.items():
+                index.setdefault(id(value), []).append(key)
+
+            self.__index = index
+            self.__publish(mapper, providers, params)
+
+    def child(self):
+        """Creates a child injector.
+
+            A child injector falls back to its parent for keywords it doesn't
+        register itself, so it can override a few providers without copying
+        the whole registry. Lookups walk up the hierarchy and are memoised
+        by the child until it or one of its ancestors is mutated; mutations
+        don't visit the children.
 
+        Returns:
+            A new `Injector` instance.
 
-class Injector(object):
-    """Main Injection class that can help implement DP pattern.
+        Examples:
+            >>> injector = Injector()
+            >>> injector['db'] = 'global'
+            >>> injector['cache'] = 'global'
+            >>> tenant = injector.child()
+            >>> tenant['db'] = 'tenant'
+            >>> tenant['db'], tenant['cache']
+            ('tenant', 'global')
+        """
+        return type(self)(parent=self)
 
-    `pyjector.Injector` class is a helper class for implementing the well-known
-    `Dependency-Injection` pattern. Provides a user-friendly decorator API for
-    injecting callables (functions or classes) into any function/class/methods
-    you want.
+    def get(self, keyword, **params):
+        """Returns the object injected for `keyword`.
 
-    Features:
-        - Register callables with aliases in injector (decorated, or method).
-        - Dict-like access in registered callables.
-        - Partial Wrap callables registered in injector instances..
-        - Doesn't affect callables that don't require specific dependency.
+        For callables registered without a scope this is the callable itself,
+        otherwise it's the instance managed by the provider scope.
 
-    Examples:
+            Keyword arguments `params` are passed to the provider factory,
+        overriding its `init_kwargs` and dependencies. Singleton and cached
+        providers memoise one instance per (hashable) argument set, in a
+        bounded LRU cache (see `Singleton` and `Cached`); call scoped ones
+        construct a new instance each time.
 
-            >>> injector = Injector()
-            >>>
-            >>> @injector.provider('days')
-            ... def days_function():
-            ...     return 365
-            ...
-            >>> @injector.inject('days')
-            ... def days_handler(days, year=1):
-            ...     return days(), year
-            ...
-            >>> print days_handler(year=3)
-            (365, 3)
+        Raises:
+            KeyError, if `keyword` is not registered in injector.
+            InjectionError, if `keyword` has a leased (e.g. pooled) scope, or
+            if `params` are given for a provider that doesn't accept them.
 
-    .. note :: Using the decorator syntax or not, you must be ware of the
-    relative path imports in your code. In the docs tutorial we describe a
-    proper way of creating dependencies in a modular way, that your api can
-    be tested independently from other parts of code.
+        Examples:
 
-    """
+            >>> injector.register_callable(connect, 'db', scope='singleton')
+            >>> injector.get('db', shard=3) is injector.get('db', shard=3)
+            True
+        """
+        mapper, providers = self.__resolved()
+        provider = providers.get(keyword)
 
-    __slots__ = ('__mapper')
+        if self.__stats is not None:
+            self.__stats.resolved((keyword,))
 
-    version = tuple(map(int, __version__.split('.')))
+        if provider is not None:
+            if provider.leased:
+                raise InjectionError('`{}` is only lent to injected '
+                                     'functions, use `Injector.lease`'
+                                     .format(keyword))
 
-    def __init__(self):
-        self.__mapper = {}
+            if not params:
+                return provider.get()
 
-    @property
-    def api(self):
-        """Returns Injector instance registered callables aliases.
+            if not provider.parameterised:
+                raise InjectionError('`{}` provider does not accept '
+                                     'arguments'.format(keyword))
+
+            return provider.get(**params)
+
+        if params:
+            raise InjectionError('`{}` is not a provider'.format(keyword))
+
+        return mapper[keyword]
+
+    def scope_of(self, keyword):
+        """Returns the bound `Scope` of `keyword`, or `None` if it's
+        registered without a scope.
+        """
+        return self.__resolved()[1].get(keyword)
+
+    @contextlib.contextmanager
+    def lease(self, keyword):
+        """Context manager lending the instance of a leased (pooled or
+        resource) provider outside of injected functions.
+
+        Examples:
+            >>> with injector.lease('db') as db:
+            ...     db.execute('SELECT 1')
         """
-        return self.__mapper.keys()
+        provider = self.scope_of(keyword)
+
+        if provider is None or not provider.leased:
+            yield self.get(keyword)
+            return
 
-    def register_callable(self, callable_obj, keyword=None, **init_kwargs):
+        instances, acquired = _Resolution(
+            (keyword,), self.__resolved(), self.generation,
+            self.dependencies
+        ).acquire()
+        error = None
+
+        try:
+            yield instances[keyword]
+        except BaseException as exc:
+            error = exc
+            raise
+        finally:
+            _release_all(acquired, error)
+
+    def register_callable(self, callable_obj, keyword=None, scope=None,
+                          **init_kwargs):
         """Register new Injection object in injector instance.
 
+            Without a `scope` the callable itself is injected. With a scope
+        the callable is used as a factory and the constructed instance is
+        injected instead:
+
+            - `'call'`: a new instance per injection.
+            - `'singleton'`: one instance, constructed on first use.
+            - `'thread'`: one instance per thread.
+            - `'context'`: one instance per `contextvars` context (asyncio
+              task).
+            - `'pooled'`: instances lent from a bounded pool for the duration
+              of each injected call (see `Pooled`).
+            - `'resource'`: a new instance per injected call, finalised after
+              the call; the factory may be a generator function or return a
+              context manager (see `Resource`).
+            - `'cached'`: instances cached with LRU eviction, and expiry
+              when created as `Cached(ttl=...)` (see `Cached`).
+
+        A `Scope` instance may be passed instead of a scope name. Async
+        factories (`async def`) are awaited by async injected functions before
+        the call, and their results are cached according to the scope.
+
+            Arguments of scoped factories named after registered keywords
+        (and not given in `init_kwargs`) are resolved from the injector
+        itself. The dependency graph is sorted once and cached until the
+        registry changes.
+
+            Registration is atomic and may run from several threads: the
+        check and the update happen under a lock shared by the injector
+        hierarchy, and the registry dicts are replaced (copy-on-write) rather
+        than mutated, so lookups and injected calls never take the lock.
+
+            `callable_obj` may also be an import string
+        (`'package.module:attr'` or `'package.module.attr'`), in which case
+        the object is imported on first use (call, or construction for scoped
+        providers) and cached, and `keyword` defaults to the attribute name.
+        The registry, `api` and `validate` don't import it. Import-string
+        providers cannot be async factories, and their dependencies are
+        registered once they are imported.
+
         Args:
-            callable_obj (object): Callable object (function or class)
+            callable_obj (object|str): Callable object (function or class),
+                or import string.
             keyword (str): The callable `alias` in injector instance.
+            scope (str|Scope): The provider scope (default None).
             **init_kwargs (dict): Params wrapped in callable.
 
         Returns:
              Self Injection instance (in order to be used on cascade).
 
         Raises:
-            InjectionError, if `keyword` already registered in injector.
+            InjectionError, if `keyword` already registered in injector, or
+            if the provider dependencies form a cycle.
 
         Examples:
             >>> injector = Injector()
@@ -89,21 +2137,454 @@ class Injector(object):
             >>> print injector['my_fn']()
             5
         """
-        if keyword in self.api:
-            raise InjectionError("`{}` keyword already exists"
-                                 .format(keyword))
+        if isinstance(callable_obj, _STRING_TYPES):
+            if keyword is None:
+                keyword = callable_obj.replace(':', '.').rsplit('.', 1)[-1]
+
+            callable_obj = _ImportString(callable_obj)
+
         if init_kwargs:
             callable_obj = functools.partial(callable_obj, **init_kwargs)
 
-        self[keyword] = callable_obj
+        provider = params = None
+
+        if scope:
+            factory = self.__provider_factory(keyword, callable_obj)
+
+            if self.__stats is not None:
+                factory = self.__stats.timed(keyword, factory)
+
+            provider = _make_scope(scope, factory)
+            params = _provider_params(callable_obj)
+
+        with self.__lock:
+            if keyword in self.__mapper:
+                raise InjectionError("`{}` keyword already exists"
+                                     .format(keyword))
+
+            self.__register(keyword, callable_obj, provider, params)
+
+            if provider is None:
+                return
+
+            try:
+                self.dependency_order()
+            except InjectionError:
+                del self[keyword]
+                raise
+
+    def batch_call(self, callable_obj, rows, chunksize=1000, executor=None,
+                   prefetch=None):
+        """Calls `callable_obj` over a stream of argument tuples, injecting
+        its dependencies once per chunk of rows.
+
+            `callable_obj` is either a function decorated with `inject`, in
+        which case this is `callable_obj.map(rows, ...)`, or a plain function
+        that gets injected with all the registered keywords it accepts.
+        Within a chunk all the calls share the same injected values: call
+        scoped providers are constructed, and leased ones acquired, once per
+        chunk.
+
+            Rows are consumed lazily and results are yielded in order, so
+        memory stays bounded by `chunksize` (times `prefetch` with an
+        executor). With a `concurrent.futures` thread or process pool as
+        `executor`, chunks run in the pool. For process pools either the
+        decorated function must be importable (e.g. decorated at module
+        level), or the undecorated one along with a named injector (see
+        `Injector.name`); dependencies are then resolved in the worker.
+
+        Args:
+            callable_obj (object): The (injected) function to call.
+            rows (iterable): The positional argument tuples of each call.
+            chunksize (int): Rows per chunk (default 1000).
+            executor (concurrent.futures.Executor): Runs the chunks.
+            prefetch (int): Chunks submitted ahead to `executor` (default
+                twice the CPU count).
+
+        Returns:
+            A generator of the call results.
+
+        Raises:
+            InjectionError, if `callable_obj` is a coroutine function.
+
+        Examples:
+
+            >>> injector = Injector()
+            >>> injector['factor'] = 10
+            >>> list(injector.batch_call(lambda x, factor: x * factor,
+            ...                          [(1,), (2,)]))
+            [10, 20]
+        """
+        if _iscoroutinefunction(callable_obj):
+            raise InjectionError('Coroutine functions cannot be batched')
+
+        if not hasattr(callable_obj, '_pj_batch'):
+            callable_obj = self.inject()(callable_obj)
+
+        if hasattr(callable_obj, '_pj_batch'):
+            batch = _Batch(callable_obj)
+        else:
+            batch = functools.partial(_call_rows, callable_obj)
+
+        return _map(batch, rows, chunksize, executor, prefetch)
+
+    def warm_up(self, max_workers=None, fork_safe=False):
+        """Constructs all singleton providers ahead of the first injection.
+
+            Independent providers are constructed concurrently in a thread
+        pool, each one after the providers it depends on. If any of them is
+        an async factory, the construction runs in an `asyncio` event loop,
+        with sync factories dispatched to the thread pool.
+
+            With `fork_safe=True` the providers of `fork_unsafe` are skipped,
+        e.g. to construct the immutable singletons in the master process of a
+        pre-forking server, which the forked workers then share
+        copy-on-write.
+
+        Args:
+            max_workers (int): Thread pool size (default as in
+                `concurrent.futures.ThreadPoolExecutor`).
+            fork_safe (bool): Only construct fork-safe providers (default
+                False).
+
+        Returns:
+            A dict mapping every constructed keyword to its construction time
+            in seconds.
+
+        Raises:
+            InjectionError, if the provider dependencies form a cycle.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        providers = self.__providers
+        skipped = self.fork_unsafe() if fork_safe else ()
+        order = tuple(keyword for keyword in self.dependency_order()
+                      if isinstance(providers.get(keyword), Singleton) and
+                      keyword not in skipped)
+        timings = {}
+
+        def _construct(keyword):
+            start = timeit.default_timer()
+            providers[keyword].get()
+            timings[keyword] = timeit.default_timer() - start
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            if any(providers[keyword].awaitable for keyword in order):
+                from pyjector._aio import warm_up
+                warm_up(order, self.dependencies, providers, _construct,
+                        executor, timings)
+                return timings
+
+            futures = {}
+
+            def _job(keyword):
+                for dependency in self.dependencies(keyword):
+                    if dependency in futures:
+                        futures[dependency].result()
+
+                _construct(keyword)
+
+            # Providers are submitted in dependency order, so a job only
+            # waits on jobs that were already picked up by a worker.
+            for keyword in order:
+                futures[keyword] = executor.submit(_job, keyword)
+
+            for future in futures.values():
+                future.result()
+
+        return timings
+
+    def fork_unsafe(self):
+        """Returns the keywords of the providers that are not fork-safe: the
+        ones with a `fork_safe=False` scope, and the ones depending on them.
+        Their instances are dropped in child processes after a fork (where
+        `os.register_at_fork` is available), so they get constructed again
+        on first use in the child.
+
+        Returns:
+            A frozenset of keywords.
+
+        Examples:
+
+            >>> injector = Injector()
+            >>> injector.register_callable(socket.socket, 'sock',
+            ...                            scope=Singleton(fork_safe=False))
+            >>> injector.fork_unsafe()
+            frozenset({'sock'})
+        """
+        providers = self.__resolved()[1]
+        unsafe = {}
+
+        def _visit(keyword):
+            if keyword not in unsafe:
+                unsafe[keyword] = not providers[keyword].fork_safe or any(
+                    _visit(dependency)
+                    for dependency in self.dependencies(keyword)
+                    if dependency in providers
+                )
+
+            return unsafe[keyword]
+
+        return frozenset(keyword for keyword in providers if _visit(keyword))
+
+    def __after_fork(self, locks, scopes):
+        """Reinitialises the injector in a child process after a fork: locks
+        are recreated (mapping the parent ones in `locks`), including the
+        ones of import strings and compiled wrappers, and fork-unsafe
+        providers dropped. Scopes shared by several injectors are handled
+        once, through `scopes`.
+        """
+        lock = locks.get(id(self.__lock))
+
+        if lock is None:
+            lock = locks[id(self.__lock)] = threading.RLock()
+
+        self.__lock = lock
+
+        if self.__stats is not None:
+            self.__stats._lock = threading.Lock()
+
+        unsafe = self.fork_unsafe()
+
+        for keyword, provider in self.__providers.items():
+            if id(provider) not in scopes:
+                scopes[id(provider)] = provider
+                provider.after_fork(keyword in unsafe)
+
+        for value in self.__mapper.values():
+            if isinstance(value, functools.partial):
+                value = value.func
+
+            if isinstance(value, _ImportString):
+                value._after_fork()
+
+        for wrapper in list(self.__sites):
+            if hasattr(wrapper, '_pj_after_fork'):
+                wrapper._pj_after_fork()
+
+    def keyword_of(self, obj):
+        """Returns the keyword `obj` is registered with (by identity), or
+        `None` if it's not registered.
 
-    def provider(self, keyword=None, **init_kwargs):
+            If `obj` is registered under several keywords, the earliest
+        registered one is returned. For child injectors, keywords of their
+        ancestors that the child (or a closer ancestor) overrides with
+        another object don't count.
+        """
+        keywords = self.__index.get(id(obj))
+
+        if keywords:
+            return keywords[0]
+
+        if self.__parent is None:
+            return None
+
+        mapper, injector = self.__resolved()[0], self.__parent
+
+        while injector is not None:
+            for keyword in injector.__index.get(id(obj), ()):
+                if mapper.get(keyword) is obj:
+                    return keyword
+
+            injector = injector.__parent
+
+    def dependencies(self, keyword):
+        """Returns the registered keywords the provider of `keyword` depends
+        on.
+        """
+        if keyword not in self.__mapper and self.__parent is not None:
+            return self.__parent.dependencies(keyword)
+
+        return self.__dependency_graph()[1].get(keyword, ())
+
+    def dependency_order(self):
+        """Returns the keywords of scoped providers in dependency order, so
+        that every provider comes after the providers it depends on.
+
+        Raises:
+            InjectionError, if the provider dependencies form a cycle.
+        """
+        return self.__dependency_graph()[2]
+
+    def validate(self):
+        """Checks that every function decorated with `inject` by this
+        injector can be injected with the current registry, and reports all
+        the problems at once:
+
+            - injected keywords that are no longer registered.
+            - providers they depend on (transitively) that miss required
+              arguments, neither given in `init_kwargs` nor registered.
+            - async providers injected in sync functions or providers.
+            - cycles in the provider dependencies.
+
+        Raises:
+            InjectionError, listing the problems found.
+        """
+        mapper, providers = self.__resolved()
+        errors, checked = [], set()
+
+        try:
+            self.dependency_order()
+        except InjectionError as error:
+            errors.append(str(error))
+
+        def _check(keyword, dependent, asynchronous):
+            if keyword not in mapper:
+                errors.append('{} depends on unregistered `{}`'.format(
+                    dependent, keyword))
+                return
+
+            provider = providers.get(keyword)
+
+            if provider is None:
+                return
+
+            if provider.awaitable and not asynchronous:
+                errors.append('{} is sync but depends on async `{}`'.format(
+                    dependent, keyword))
+
+            if keyword in checked:
+                return
+
+            checked.add(keyword)
+
+            for name in _required_params(mapper[keyword]):
+                if name not in mapper:
+                    errors.append('`{}` provider requires unregistered `{}`'
+                                  .format(keyword, name))
+
+            for dependency in self.dependencies(keyword):
+                _check(dependency, '`{}` provider'.format(keyword),
+                       provider.awaitable)
+
+        sites = sorted(((_qualname(wrapper._pj_site[0]), wrapper._pj_site)
+                        for wrapper in list(self.__sites)),
+                       key=lambda site: site[0])
+
+        for name, (callable_obj, plan) in sites:
+            for keyword in plan:
+                _check(keyword, name, _iscoroutinefunction(callable_obj))
+
+        if errors:
+            raise InjectionError('Invalid injection(s):\n  {}'.format(
+                '\n  '.join(errors)))
+
+    def compile_all(self):
+        """Validates the injector (see `validate`), then resolves the
+        injection plan of every function decorated with `inject` by this
+        injector against the current registry, so that the first calls
+        don't pay for it. Call it once all the providers are registered,
+        e.g. at the end of the application startup.
+
+        Returns:
+            The number of prepared decorated functions.
+
+        Raises:
+            InjectionError, listing the problems found by `validate`.
+        """
+        self.validate()
+        sites = list(self.__sites)
+
+        for wrapper in sites:
+            wrapper._pj_prepare()
+
+        return len(sites)
+
+    def __dependency_graph(self):
+        # Dependencies registered by an ancestor count, so the graph of a
+        # child is kept per generation of the whole chain.
+        generation = self.generation
+        graph = self.__graph
+
+        if graph is None or graph[0] != generation:
+            mapper = self.__resolved()[0]
+            edges = dict(
+                (keyword, tuple(name for name in params if name in mapper))
+                for keyword, params in self.__params.items()
+            )
+            graph = self.__graph = (generation, edges, _sort_graph(edges))
+
+        return graph
+
+    def __resolve_dependencies(self, keyword, overrides):
+        kwargs = dict(overrides)
+
+        for dependency in self.dependencies(keyword):
+            if dependency not in kwargs:
+                kwargs[dependency] = self.get(dependency)
+
+        return kwargs
+
+    def __provider_factory(self, keyword, callable_obj):
+        # Leased dependencies are acquired by the injected call and passed
+        # to the factory as keyword arguments (`overrides`).
+        resolve = functools.partial(self.__resolve_dependencies, keyword)
+
+        if _iscoroutinefunction(callable_obj):
+            from pyjector._aio import dependent_factory
+            return dependent_factory(callable_obj, resolve)
+
+        target = callable_obj.func \
+            if isinstance(callable_obj, functools.partial) else callable_obj
+
+        if isinstance(target, _ImportString):
+            # The arguments, hence the dependencies, of import-string
+            # providers are only known once imported, on first construction.
+            loaded = []
+
+            @_wraps(callable_obj)
+            def _factory(**overrides):
+                if not loaded:
+                    self.__load(keyword, callable_obj, target.load())
+                    loaded.append(True)
+
+                return callable_obj(**resolve(overrides))
+
+            return _factory
+
+        @_wraps(callable_obj)
+        def _factory(**overrides):
+            return callable_obj(**resolve(overrides))
+
+        return _factory
+
+    def __load(self, keyword, callable_obj, target):
+        """Registers the dependencies of the imported `target` of the
+        import-string provider `keyword`.
+        """
+        if _iscoroutinefunction(target):
+            raise InjectionError('`{}` import-string provider cannot be an '
+                                 'async factory'.format(keyword))
+
+        bound = callable_obj.keywords \
+            if isinstance(callable_obj, functools.partial) else {}
+        params = tuple(name for name in _provider_params(target)
+                       if name not in bound)
+
+        with self.__lock:
+            if self.__mapper.get(keyword) is not callable_obj or \
+                    self.__params.get(keyword) == params:
+                return
+
+            previous = self.__params
+            all_params = dict(previous)
+            all_params[keyword] = params
+            self.__publish(self.__mapper, self.__providers, all_params)
+
+            try:
+                self.dependency_order()
+            except InjectionError:
+                self.__publish(self.__mapper, self.__providers, previous)
+                raise
+
+    def provider(self, keyword=None, scope=None, **init_kwargs):
         """Implements the same functionality as `Injector.register_callable`
         as decorator.
 
 
         Args:
             keyword (str): The callable `alias` in injector instance.
+            scope (str|Scope): The provider scope (default None).
             init_kwargs (dict): Params wrapped in callable
 
         Keyword Args:
@@ -123,11 +2604,12 @@ class Injector(object):
             True
         """
         def _wrapped(callable_obj):
-            self.register_callable(callable_obj, keyword, **init_kwargs)
+            self.register_callable(callable_obj, keyword, scope,
+                                   **init_kwargs)
 
         return _wrapped
 
-    def inject(self, *keyword):
+    def inject(self, *keyword, **options):
         """Inject a dependency based on alias. The implementation is
         decorator-based.
 
@@ -136,9 +2618,43 @@ class Injector(object):
         the same name as the alias of the callable. If this doesn't happen,
         the `Injector.inject` methods returns the decorated function as is.
 
+            Arguments the caller supplies, positionally or by keyword, are
+        not injected. Injected arguments that directly follow the caller's
+        positional arguments are passed positionally.
+
+            With `compiled=True` a specialised wrapper is generated per
+        decorated function, with the exact parameter list of the function and
+        the registry lookups inlined, which removes the generic `*args,
+        **kwargs` handling from the call path. Compiled and generic wrappers
+        accept the same calls; functions already decorated with `inject` get
+        a generic wrapper.
+
+            Coroutine functions (`async def`) get an async wrapper, which
+        awaits the values of async providers concurrently before the call.
+        Other wrappers have a `map(iterable, chunksize=1000, executor=None,
+        prefetch=None)` method, see `batch_call`, and can be sent to process
+        pools: decorated functions pickle by reference, and wrappers of
+        importable functions (`wrapped = injector.inject()(handler)`), which
+        are callable objects forwarding to the wrapper, by reference to the
+        function, the named injector (see `Injector.name`) and the keywords.
+
+            With `lazy=True` (or a list of keywords) scoped dependencies are
+        injected as proxies, which construct the dependency on first use and
+        forward to it. Plain objects and leased or async providers are never
+        proxied.
+
         Args:
             keyword (list): The callable `alias` in injector instance.
 
+        Keyword Args:
+            compiled (bool): Generate a specialised wrapper (default False,
+                True on frozen injectors).
+            lazy (bool|list): Inject scoped dependencies lazily (default
+                False).
+
+        .. note :: On instrumented injectors the wrapper also counts calls
+        and resolutions, see `Injector.stats`.
+
         Returns:
             The decorated callable instance
 
@@ -160,6 +2676,14 @@ class Injector(object):
             >>> days_handler(year=3)
             (365, 3)
         """
+        compiled = options.pop('compiled', self.__frozen)
+        lazy = options.pop('lazy', False)
+
+        if options:
+            raise TypeError('Unexpected option(s): {}'.format(
+                ', '.join(sorted(options))
+            ))
+
         kw_set = set(keyword)
         api_set = set(self.api)
 
@@ -171,27 +2695,131 @@ class Injector(object):
                 kw_set.difference(api_set)
             ))
 
+        inject_set = kw_set or api_set
+
+        if lazy is True:
+            lazy = inject_set
+
+        lazy = frozenset(lazy or ())
+
+        if not lazy.issubset(inject_set):
+            raise InjectionError('Invalid lazy key name(s): {}'.format(
+                lazy.difference(inject_set)
+            ))
+
         def _wrapped(callable_obj):
 
-            @functools.wraps(callable_obj)
-            def __wrapped(*args, **kwargs):
+            # The injection plan is computed once, at decoration time, so the
+            # wrapper below only performs a dict lookup per injected argument.
+            plan = tuple(kw for kw in _argnames(callable_obj)
+                         if kw in inject_set)
 
-                callable_set = set(inspect.getargspec(callable_obj).args)
+            if not plan:
+                return callable_obj
 
-                inject_set = kw_set.intersection(api_set) if kw_set else api_set
+            wrapper = self.__wrapper(callable_obj, plan, compiled, lazy)
 
-                for kw in inject_set.intersection(callable_set):
-                    kwargs[kw] = self[kw]
+            if self.__stats is not None:
+                wrapper = self.__stats.counted(callable_obj, wrapper, plan)
 
-                return callable_obj(*args, **kwargs)
+            # A function wrapper could not be pickled by reference, as the
+            # undecorated function holds its name (see `_Injected`).
+            if _importable(callable_obj) and \
+                    not _iscoroutinefunction(callable_obj):
+                wrapper = _Injected(wrapper)
 
-            return __wrapped
+            wrapper._pj_site = (callable_obj, plan)
+            self.__sites.add(wrapper)
+
+            if not _iscoroutinefunction(callable_obj):
+                wrapper._pj_batch = functools.partial(
+                    _call_batch, callable_obj, plan,
+                    _positions(callable_obj, plan),
+                    functools.partial(self.__resolution, lazy=lazy)
+                )
+                wrapper._pj_spec = (callable_obj, self, keyword,
+                                    {'compiled': compiled, 'lazy': lazy})
+                wrapper.map = functools.partial(_map, _Batch(wrapper))
+
+            return wrapper
 
         return _wrapped
 
+    def __wrapper(self, callable_obj, plan, compiled, lazy):
+        """Returns the wrapper injecting `plan` arguments in `callable_obj`.
+        """
+        resolve = functools.partial(self.__resolution, lazy=lazy)
+
+        positions = _positions(callable_obj, plan)
+
+        if _iscoroutinefunction(callable_obj):
+            from pyjector._aio import async_wrapper
+            return async_wrapper(callable_obj, plan, positions, self, resolve)
+
+        if compiled:
+            wrapper = _compile_wrapper(callable_obj, plan, self, resolve,
+                                       static=self.__frozen)
+
+            if wrapper is not None:
+                return wrapper
+
+        # The plan is resolved against the registry once per generation, and
+        # bound once per number of positional arguments, so the call path
+        # only checks the generation and applies the result. Injected values
+        # directly following the caller's positional arguments are passed
+        # positionally, and arguments the caller supplied are not injected.
+        cache = [_UNRESOLVED]
+        names = frozenset(plan)
+        chained = self.__parent is not None
+
+        @functools.wraps(callable_obj)
+        def __wrapped(*args, **kwargs):
+            resolution = cache[0]
+
+            if resolution.generation != (self.generation if chained else
+                                         self.__generation):
+                resolution = cache[0] = resolve(plan)
+
+            count = len(args)
+            head, tail, constant = resolution.bindings.get(count) or \
+                resolution.bind(positions, count)
+
+            if kwargs and not names.isdisjoint(kwargs):
+                head, tail = _unsupplied(head, tail, kwargs)
+            elif constant is not None:
+                kwargs.update(constant[1])
+                return callable_obj(*(args + constant[0]), **kwargs)
+
+            return resolution.call(callable_obj, args, kwargs, head, tail)
+
+        def _prepare():
+            resolution = cache[0]
+
+            if resolution.generation != self.generation:
+                resolution = cache[0] = resolve(plan)
+
+            for count in range(max(list(positions.values()) or [-1]) + 2):
+                resolution.bind(positions, count)
+
+        __wrapped._pj_prepare = _prepare
+
+        return __wrapped
+
+    def __resolution(self, plan, lazy=()):
+        generation = self.generation
+        return _Resolution(plan, self.__resolved(), generation,
+                           self.dependencies, lazy)
+
+    def __reduce__(self):
+        if self.__name is None:
+            raise TypeError('Only named injectors can be pickled, see '
+                            '`Injector.name`')
+
+        return _named_injector, (self.__name,)
+
     def __str__(self):
         return '<Injector> instance: ({})'.format(
-            ', '.join(self.api)
+            ', '.join(sorted(self.api))
         )
 
     def __repr__(self):  # pragma: no cover
@@ -204,14 +2832,120 @@ class Injector(object):
         for keyword in self.api:
             yield keyword
 
+    def __resolved(self):
+        """Returns the `(mapper, providers)` mappings lookups go through: the
+        registry dicts of a root injector, and `_Chained` views over the
+        whole hierarchy for a child one, kept as `(generation, view)` until
+        the child or one of its ancestors is mutated.
+        """
+        if self.__parent is None:
+            return self.__view
+
+        # The generation is read before the registry dicts, which are
+        # published before it changes (see `__publish`), so a view is never
+        # older than the generation it's kept for.
+        generation = self.generation
+        view = self.__view
+
+        if view is None or view[0] != generation:
+            levels, injector = [], self
+
+            while injector is not None:
+                levels.append((injector.__mapper, injector.__providers))
+                injector = injector.__parent
+
+            view = self.__view = (generation, (_Chained(levels, 0),
+                                               _Chained(levels, 1)))
+
+        return view[1]
+
+    def __touch(self):
+        """Invalidates the caches depending on the registry. Child injectors
+        compare the generation of the whole chain instead (see `generation`).
+        """
+        self.__generation += 1
+        self.__graph = None
+
+    def __check_mutable(self):
+        if self.__frozen:
+            raise InjectionError('Frozen injector is read-only')
+
+    def __register(self, key, value, provider=None, params=None):
+        with self.__lock:
+            self.__check_mutable()
+            mapper, providers, all_params = self.__unindexed(key)
+            mapper[key] = value
+            self.__index.setdefault(id(value), []).append(key)
+
+            if provider is not None:
+                providers, all_params = dict(providers), dict(all_params)
+                providers[key] = provider
+                all_params[key] = params
+
+            self.__publish(mapper, providers, all_params)
+
+    def __unindexed(self, key):
+        """Returns the registry dicts without `key`, to be published by the
+        caller. The mapper is always a copy; the providers and params dicts
+        are only copied if `key` has to be removed from them. The index only
+        serves single-key lookups and is updated in place.
+        """
+        mapper, index = dict(self.__mapper), self.__index
+        providers, params = self.__providers, self.__params
+
+        if key in providers:
+            providers, params = dict(providers), dict(params)
+
+        if key in mapper:
+            ident = id(mapper.pop(key))
+
+            # Lists are never emptied in place, as readers may hold them.
+            if index[ident] == [key]:
+                del index[ident]
+            else:
+                index[ident].remove(key)
+
+            providers.pop(key, None)
+            params.pop(key, None)
+
+        return mapper, providers, params
+
+    def __publish(self, mapper, providers, params):
+        """Swaps in new registry dicts (copy-on-write), so that lock-free
+        readers always see a consistent registry, and invalidates the caches.
+        """
+        self.__mapper = mapper
+        self.__providers, self.__params = providers, params
+
+        if self.__parent is None:
+            self.__view = (mapper, providers)
+
+        self.__touch()
+
     def __setitem__(self, key, value):
-        self.__mapper[key] = value
+        self.__register(key, value)
 
     def __getitem__(self, key):
-        return self.__mapper[key]
+        return self.__resolved()[0][key]
 
     def __delitem__(self, key):
-        del self.__mapper[key]
+        with self.__lock:
+            self.__check_mutable()
+
+            if key not in self.__mapper:
+                raise KeyError(key)
+
+            self.__publish(*self.__unindexed(key))
 
     def __contains__(self, item):
-        return item in list(self.__mapper.keys()) + list(self.__mapper.values())
+        try:
+            if item in self.__resolved()[0]:
+                return True
+        except TypeError:
+            pass
+
+        return self.keyword_of(item) is not None
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork)
@@ -5,6 +5,8 @@
 __author__ = 'Papavassiliou Vassilis'
 
 
+import sys
+
 import pytest
 from pyjector import Injector
 
@@ -50,3 +52,7 @@ def custom_func():
         return op(text_1, text_2)
 
     return _custom_function
+
+
+if sys.version_info < (3, 5):
+    collect_ignore = ['test_aio.py']
@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+"""Unit Tests for `pyjector` package asyncio support.
+"""
+
+__author__ = 'Papavassiliou Vassilis'
+
+import asyncio
+
+import pytest
+
+from pyjector import InjectionError, Injector
+
+
+def test_injector_inject_coroutine_function():
+    """Testing `pyjector.Injector.inject` method returns an async wrapper for
+    coroutine functions.
+    """
+    injector = Injector()
+    injector['add'] = lambda x, y: x + y
+
+    @injector.inject('add')
+    async def handler(add, x):
+        return add(x, 1)
+
+    assert asyncio.iscoroutinefunction(handler)
+    assert asyncio.run(handler(x=1)) == 2
+
+
+def test_injector_async_provider_singleton():
+    """Testing async providers are awaited before injection and cached by
+    their scope.
+    """
+    injector = Injector()
+    calls = []
+
+    async def make_pool():
+        calls.append(1)
+        await asyncio.sleep(0)
+        return object()
+
+    injector.provider('pool', scope='singleton')(make_pool)
+
+    @injector.inject('pool')
+    async def handler(pool):
+        return pool
+
+    async def main():
+        return await handler(), await handler()
+
+    first, second = asyncio.run(main())
+
+    assert first is second
+    assert len(calls) == 1
+
+
+def test_injector_async_providers_resolved_concurrently():
+    """Testing async providers of a single call are resolved concurrently.
+    """
+    injector = Injector()
+    running = []
+
+    def make(name):
+        async def _factory():
+            running.append(name)
+            await asyncio.sleep(0.05)
+            return name
+
+        return _factory
+
+    for name in ('a', 'b', 'c'):
+        injector.register_callable(make(name), name, scope='call')
+
+    @injector.inject('a', 'b', 'c')
+    async def handler(a, b, c):
+        return a + b + c
+
+    loop = asyncio.new_event_loop()
+
+    try:
+        start = loop.time()
+        assert loop.run_until_complete(handler()) == 'abc'
+        assert loop.time() - start < 0.15
+    finally:
+        loop.close()
+
+
+def test_injector_async_provider_dependencies():
+    """Testing async providers get async dependencies awaited before the
+    call.
+    """
+    injector = Injector()
+
+    async def make_config():
+        return {'dsn': 'sqlite://'}
+
+    async def make_db(config):
+        return config['dsn']
+
+    injector.register_callable(make_config, 'config', scope='singleton')
+    injector.register_callable(make_db, 'db', scope='singleton')
+
+    @injector.inject('db')
+    async def handler(db):
+        return db
+
+    assert asyncio.run(handler()) == 'sqlite://'
+
+
+def test_injector_warm_up_async_providers():
+    """Testing `pyjector.Injector.warm_up` awaits async singleton factories.
+    """
+    injector = Injector()
+
+    async def make_pool(config):
+        await asyncio.sleep(0)
+        return config + ':pool'
+
+    injector.register_callable(lambda: 'config', 'config', scope='singleton')
+    injector.register_callable(make_pool, 'pool', scope='singleton')
+
+    timings = injector.warm_up()
+
+    @injector.inject('pool')
+    async def handler(pool):
+        return pool
+
+    assert sorted(timings) == ['config', 'pool']
+    assert asyncio.run(handler()) == 'config:pool'
+
+
+def test_injector_async_resource_scope():
+    """Testing async generator providers are entered before the call and
+    finalised after it.
+    """
+    injector = Injector()
+    events = []
+
+    async def session():
+        events.append('open')
+        yield 'session'
+        events.append('close')
+
+    injector.register_callable(session, 'session', scope='resource')
+
+    @injector.inject('session')
+    async def handler(session):
+        events.append(session)
+        return session
+
+    assert asyncio.run(handler()) == 'session'
+    assert events == ['open', 'session', 'close']
+
+
+def test_injector_inject_coroutine_function_supplied_arguments():
+    """Testing async wrappers do not inject the arguments supplied by the
+    caller, positionally or by keyword.
+    """
+    injector = Injector()
+
+    async def make_pool():
+        return 'pool'
+
+    injector.provider('pool', scope='singleton')(make_pool)
+    injector['name'] = 'pyjector'
+
+    @injector.inject()
+    async def handler(pool, name, x=0):
+        return pool, name, x
+
+    assert asyncio.run(handler()) == ('pool', 'pyjector', 0)
+    assert asyncio.run(handler('mine', x=1)) == ('mine', 'pyjector', 1)
+    assert asyncio.run(handler(name='other')) == ('pool', 'other', 0)
+
+
+def test_injector_inject_coroutine_function_supplied_leases():
+    """Testing async wrappers do not acquire leased providers for the
+    arguments supplied by the caller.
+    """
+    injector = Injector()
+    events = []
+
+    async def session():
+        events.append('open')
+        yield 'session'
+
+    injector.register_callable(session, 'session', scope='resource')
+
+    @injector.inject('session')
+    async def handler(session):
+        return session
+
+    assert asyncio.run(handler(session='mine')) == 'mine'
+    assert asyncio.run(handler('mine')) == 'mine'
+    assert events == []
+    assert asyncio.run(handler()) == 'session'
+    assert events == ['open']
+
+
+def test_injector_async_provider_failure_retried():
+    """Testing failed async providers are constructed again on next use,
+    and that async providers require a running event loop.
+    """
+    injector = Injector()
+    calls = []
+
+    async def make_pool(shard=0):
+        calls.append(shard)
+
+        if len(calls) == 1:
+            raise ValueError('unavailable')
+
+        return 'pool'
+
+    injector.provider('pool', scope='singleton')(make_pool)
+
+    @injector.inject('pool')
+    async def handler(pool):
+        return pool
+
+    async def variant():
+        return await injector.get('pool', shard=1)
+
+    with pytest.raises(ValueError):
+        asyncio.run(handler())
+
+    assert asyncio.run(handler()) == 'pool'
+    assert asyncio.run(variant()) == 'pool'
+    assert calls == [0, 0, 1]
+
+    injector.provider('other', scope='singleton')(make_pool)
+
+    with pytest.raises(InjectionError):
+        injector.get('other')
+
+
+def test_injector_validate_async_providers():
+    """Testing `pyjector.Injector.validate` reports async providers injected
+    in sync functions.
+    """
+    injector = Injector()
+
+    async def make_client():
+        return 'client'
+
+    injector.register_callable(make_client, 'client', scope='singleton')
+
+    @injector.inject('client')
+    def fetch(client):
+        return client
+
+    @injector.inject('client')
+    async def handler(client):
+        return client
+
+    with pytest.raises(InjectionError) as error:
+        injector.compile_all()
+
+    assert 'fetch is sync but depends on async `client`' in str(error.value)
+    assert 'handler' not in str(error.value)
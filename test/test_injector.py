@@ -4,8 +4,18 @@
 
 __author__ = 'Papavassiliou Vassilis'
 
+import contextlib
+import gc
+import os
+import pickle
+import sys
+import textwrap
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
 import pytest
-from pyjector import InjectionError
+from pyjector import Cached, InjectionError, Injector, Pooled, Singleton
 
 
 def test_injector_register_callable(injector, callable_obj):
@@ -47,39 +57,46 @@ def test_injector_provider_method_error(injector):
         injector.provider('add')(lambda x, y: x - y)
 
 
-def test_injector_inject_method_single(injector, custom_func):
+@pytest.mark.parametrize('compiled', [False, True])
+def test_injector_inject_method_single(injector, custom_func, compiled):
     """Testing `pyjector.Injector.inject` method on providing single object.
     """
-    custom_fn = injector.inject('op')(custom_func)
+    custom_fn = injector.inject('op', compiled=compiled)(custom_func)
 
     assert custom_fn('foo', 'bar') == '(foo: bar)'
 
 
-def test_injector_inject_method_multiple(injector):
+@pytest.mark.parametrize('compiled', [False, True])
+def test_injector_inject_method_multiple(injector, compiled):
     """Testing `pyjector.Injector.inject` method on providing single object.
     """
 
     def test_fn(op, add, x, y):
         return op(add(x, y), add(x + 1, y + 1))
 
-    custom_f = injector.inject('op', 'add')(test_fn)
+    custom_f = injector.inject('op', 'add', compiled=compiled)(test_fn)
 
     assert custom_f(x=1, y=1) == '(2: 4)'
 
 
-def test_injector_inject_method_invalid_key_error(injector):
+@pytest.mark.parametrize('compiled', [False, True])
+def test_injector_inject_method_invalid_key_error(injector, compiled):
     """Testing `pyjector.Injector.inject` method error handling
         on invalid key to provide.
     """
     with pytest.raises(InjectionError):
-        return injector.inject('that')(lambda that: that * 2)
+        return injector.inject('that', compiled=compiled)(
+            lambda that: that * 2
+        )
 
 
-def test_injector_inject_method_invalid_callable_parameter_pass(injector):
+@pytest.mark.parametrize('compiled', [False, True])
+def test_injector_inject_method_invalid_callable_parameter_pass(injector,
+                                                                compiled):
     """Testing `pyjector.Injector.inject` method error handling
         on providing a callable to function that doesn't accept it.
     """
-    test_func = injector.inject('add')(lambda: 'hi')
+    test_func = injector.inject('add', compiled=compiled)(lambda: 'hi')
 
     assert test_func() == 'hi'
 
@@ -124,3 +141,1231 @@ def test_injector_str(injector):
     """Testing `pyjector.Injector.__str__` method.
     """
     assert str(injector) == '<Injector> instance: (art, op)'
+
+
+def test_injector_inject_method_plan_reflects_registry():
+    """Testing `pyjector.Injector.inject` method resolves injected objects
+    on call, so registry changes after decoration are visible.
+    """
+    injector = Injector()
+    injector['value'] = lambda: 1
+
+    @injector.inject('value')
+    def handler(value, extra=0):
+        return value() + extra
+
+    assert handler(extra=1) == 2
+
+    injector['value'] = lambda: 10
+
+    assert handler() == 10
+
+
+def test_injector_inject_method_compiled_signature():
+    """Testing `pyjector.Injector.inject` compiled wrappers keep defaults,
+    variadic and keyword-only arguments of the decorated function.
+    """
+    injector = Injector()
+    injector['db'] = 'db'
+
+    def handler(x, db, y=2, *args, **kwargs):
+        return x, db, y, args, kwargs
+
+    wrapped = injector.inject('db', compiled=True)(handler)
+
+    assert wrapped.__name__ == 'handler'
+    assert wrapped(1) == (1, 'db', 2, (), {})
+    assert wrapped(1, y=3, z=5) == (1, 'db', 3, (), {'z': 5})
+    assert wrapped(1, 3, 4, 5) == (1, 3, 4, (5,), {})
+
+    def ordered(db, x):
+        return db, x
+
+    wrapped = injector.inject('db', compiled=True)(ordered)
+
+    assert wrapped(x=5) == ('db', 5)
+    assert wrapped('mine', 5) == ('mine', 5)
+    assert wrapped(db='mine', x=5) == ('mine', 5)
+
+    with pytest.raises(TypeError):
+        wrapped(5)
+
+
+def test_injector_inject_method_invalid_option():
+    """Testing `pyjector.Injector.inject` method error handling on unknown
+    options.
+    """
+    with pytest.raises(TypeError):
+        Injector().inject(fast=True)
+
+
+@pytest.mark.parametrize('compiled', [False, True])
+def test_injector_singleton_scope(compiled):
+    """Testing `pyjector.Injector.register_callable` singleton scope
+    constructs the provided instance once, on first use.
+    """
+    injector = Injector()
+    calls = []
+
+    def make_db():
+        calls.append(1)
+        return object()
+
+    injector.provider('db', scope='singleton')(make_db)
+
+    @injector.inject('db', compiled=compiled)
+    def handler(db):
+        return db
+
+    assert calls == []
+    assert handler() is handler() is injector.get('db')
+    assert len(calls) == 1
+    assert injector['db'] is make_db
+
+
+def test_injector_singleton_scope_threads():
+    """Testing `pyjector.Singleton` scope constructs a single instance under
+    concurrent first use.
+    """
+    injector = Injector()
+    calls = []
+
+    def make_client():
+        calls.append(1)
+        time.sleep(0.01)
+        return object()
+
+    injector.register_callable(make_client, 'client', scope='singleton')
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(
+        injector.get('client'))) for _ in range(16)]
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert len(set(map(id, results))) == 1
+
+
+def test_injector_invalid_scope_error():
+    """Testing `pyjector.Injector.register_callable` method error handling on
+    unknown scopes.
+    """
+    with pytest.raises(InjectionError):
+        Injector().register_callable(lambda: 1, 'one', scope='forever')
+
+
+def test_injector_thread_scope_stress():
+    """Testing `pyjector.ThreadLocal` scope constructs one instance per
+    thread under concurrent injection.
+    """
+    injector = Injector()
+    instances = []
+    lock = threading.Lock()
+
+    def make_session():
+        session = object()
+        with lock:
+            instances.append(session)
+        return session
+
+    injector.register_callable(make_session, 'session', scope='thread')
+
+    @injector.inject('session')
+    def handler(session):
+        return session
+
+    seen = {}
+
+    def worker(index):
+        sessions = set(id(handler()) for _ in range(200))
+        seen[index] = sessions
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(32)]
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    assert len(instances) == 32
+    assert all(len(sessions) == 1 for sessions in seen.values())
+    assert len(set.union(*seen.values())) == 32
+
+
+def test_injector_context_scope():
+    """Testing `pyjector.ContextLocal` scope constructs one instance per
+    context.
+    """
+    contextvars = pytest.importorskip('contextvars')
+
+    injector = Injector()
+    injector.register_callable(object, 'request', scope='context')
+
+    @injector.inject('request')
+    def handler(request):
+        return request
+
+    first = contextvars.copy_context().run(lambda: (handler(), handler()))
+    second = contextvars.copy_context().run(handler)
+
+    assert first[0] is first[1]
+    assert first[0] is not second
+
+
+def test_injector_provider_dependencies():
+    """Testing scoped providers get their arguments resolved from the
+    injector.
+    """
+    injector = Injector()
+    injector.register_callable(lambda config, name: (config, name), 'db',
+                               scope='singleton', name='main')
+    injector.register_callable(lambda: {'dsn': 'sqlite://'}, 'config',
+                               scope='singleton')
+
+    @injector.inject('db')
+    def handler(db):
+        return db
+
+    assert handler() == ({'dsn': 'sqlite://'}, 'main')
+    assert handler()[0] is injector.get('config')
+    assert injector.dependencies('db') == ('config',)
+    assert injector.dependency_order() == ('config', 'db')
+    assert injector.scope_of('db').factory.__wrapped__ is injector['db']
+
+
+def test_injector_provider_dependencies_cycle_error():
+    """Testing `pyjector.Injector.register_callable` method error handling on
+    circular provider dependencies.
+    """
+    injector = Injector()
+    injector.register_callable(lambda b: b, 'a', scope='call')
+
+    with pytest.raises(InjectionError):
+        injector.register_callable(lambda a: a, 'b', scope='call')
+
+    assert injector.api == ['a']
+
+
+def test_injector_warm_up():
+    """Testing `pyjector.Injector.warm_up` constructs independent singletons
+    concurrently, after their dependencies.
+    """
+    injector = Injector()
+    constructed = []
+
+    def make(name):
+        def _factory(**deps):
+            time.sleep(0.05)
+            constructed.append(name)
+            return name
+
+        return _factory
+
+    for name in ('a', 'b', 'c', 'd'):
+        injector.register_callable(make(name), name, scope='singleton')
+
+    injector.register_callable(lambda a, b: a + b, 'ab', scope='singleton')
+    injector.register_callable(lambda: 'x', 'x', scope='call')
+
+    start = time.time()
+    timings = injector.warm_up(max_workers=4)
+
+    assert time.time() - start < 0.15
+    assert sorted(timings) == ['a', 'ab', 'b', 'c', 'd']
+    assert sorted(constructed) == ['a', 'b', 'c', 'd']
+    assert injector.get('ab') == 'ab'
+
+
+def test_injector_keyword_of():
+    """Testing `pyjector.Injector.keyword_of` and `__contains__` reverse
+    index stay in sync with registry changes.
+    """
+    injector = Injector()
+    fixtures, other = ['unhashable'], object()
+
+    injector['fixtures'] = fixtures
+    injector['alias'] = fixtures
+
+    assert fixtures in injector
+    assert injector.keyword_of(fixtures) == 'fixtures'
+
+    del injector['fixtures']
+
+    assert injector.keyword_of(fixtures) == 'alias'
+
+    injector['alias'] = other
+
+    assert fixtures not in injector
+    assert injector.keyword_of(fixtures) is None
+    assert injector.keyword_of(other) == 'alias'
+    assert 'alias' in injector
+
+    child = injector.child()
+    child['alias'] = fixtures
+
+    assert other not in child
+    assert child.keyword_of(other) is None
+    assert child.keyword_of(fixtures) == 'alias'
+
+    injector['shared'] = other
+    assert child.keyword_of(other) == 'shared'
+
+
+@pytest.mark.parametrize('compiled', [False, True])
+def test_injector_child(compiled):
+    """Testing `pyjector.Injector.child` overrides and falls back to its
+    parent, following parent mutations.
+    """
+    injector = Injector()
+    injector['db'] = 'global-db'
+    injector['cache'] = 'global-cache'
+
+    tenant = injector.child()
+    tenant['db'] = 'tenant-db'
+    request = tenant.child()
+
+    @request.inject(compiled=compiled)
+    def handler(db, cache):
+        return db, cache
+
+    assert handler() == ('tenant-db', 'global-cache')
+    assert request.parent is tenant
+    assert sorted(request.api) == ['cache', 'db']
+
+    generation = request.generation
+    injector['cache'] = 'new-cache'
+
+    assert request.generation != generation
+    assert handler() == ('tenant-db', 'new-cache')
+
+    del tenant['db']
+
+    assert handler() == ('global-db', 'new-cache')
+    assert 'new-cache' in request
+    assert injector.api == ['db', 'cache']
+
+
+def test_injector_child_scoped_providers():
+    """Testing child injectors resolve their own provider dependencies from
+    the whole hierarchy.
+    """
+    injector = Injector()
+    injector['dsn'] = 'sqlite://global'
+    tenant = injector.child()
+    tenant['dsn'] = 'sqlite://tenant'
+    tenant.register_callable(lambda dsn: dsn, 'db', scope='singleton')
+
+    assert tenant.get('db') == 'sqlite://tenant'
+    assert 'db' not in injector.api
+
+    injector.register_callable(lambda: 'global-cache', 'cache',
+                               scope='singleton')
+    tenant['cache'] = 'tenant-cache'
+    request = tenant.child()
+
+    assert request.get('cache') == 'tenant-cache'
+    assert request.scope_of('cache') is None
+    assert request.scope_of('db') is tenant.scope_of('db')
+    assert sorted(request.api) == ['cache', 'db', 'dsn']
+
+    tenant.register_callable(lambda dsn, log: log, 'audit', scope='call')
+
+    assert request.dependencies('audit') == ('dsn',)
+
+    injector['log'] = 'global-log'
+
+    assert request.dependencies('audit') == ('dsn', 'log')
+    assert request.get('audit') == 'global-log'
+    assert object() not in request
+
+
+def test_injector_stats():
+    """Testing `pyjector.Injector.stats` on instrumented injectors.
+    """
+    assert Injector().stats() is None
+
+    injector = Injector(instrument=True)
+    injector.register_callable(lambda: 'db', 'db', scope='singleton')
+    injector.register_callable(lambda: 'req', 'request', scope='call')
+    injector['add'] = lambda x, y: x + y
+
+    @injector.inject()
+    def handler(db, request, add):
+        return db, request
+
+    for _ in range(10):
+        handler()
+
+    child = injector.child()
+    child.get('db')
+
+    stats = injector.stats()
+    providers = stats['providers']
+
+    assert providers['db']['resolutions'] == 11
+    assert providers['db']['constructions'] == 1
+    assert providers['request']['constructions'] == 10
+    assert providers['add']['constructions'] == 0
+    assert providers['add']['p50'] is None
+    assert providers['request']['p99'] >= providers['request']['p50'] > 0
+    assert stats['functions'] == {
+        '{}.{}'.format(__name__, handler.__qualname__): 10
+    }
+
+
+@pytest.mark.parametrize('compiled', [False, True])
+def test_injector_pooled_scope(compiled):
+    """Testing `pyjector.Pooled` scope lends instances for the duration of
+    each call and returns them afterwards, even on errors.
+    """
+    injector = Injector()
+    injector.register_callable(list, 'conn', scope='pooled')
+
+    @injector.inject('conn', compiled=compiled)
+    def handler(conn, fail=False):
+        conn.append(1)
+        assert injector.scope_of('conn').stats()['in_use'] == 1
+
+        if fail:
+            raise ValueError(conn)
+
+        return conn
+
+    assert handler() is handler()
+
+    with pytest.raises(ValueError):
+        handler(fail=True)
+
+    stats = injector.scope_of('conn').stats()
+
+    assert (stats['size'], stats['in_use'], stats['idle']) == (1, 0, 1)
+
+    with injector.lease('conn') as conn:
+        assert conn == [1, 1, 1]
+
+    with pytest.raises(InjectionError):
+        injector.get('conn')
+
+
+def test_injector_pooled_scope_bounded():
+    """Testing `pyjector.Pooled` scope blocks when exhausted, times out and
+    replaces instances failing the health-check.
+    """
+    injector = Injector()
+    injector.register_callable(
+        dict, 'conn', scope=Pooled(maxsize=2, timeout=0.05,
+                                   check=lambda conn: not conn.get('broken'))
+    )
+    pool = injector.scope_of('conn')
+    (first, _), (second, _) = pool.acquire(), pool.acquire()
+
+    with pytest.raises(InjectionError):
+        pool.acquire()
+
+    threading.Timer(0.01, pool.release, (first,)).start()
+    first['broken'] = True
+    third, _ = pool.acquire()
+
+    assert third is not first and not third
+    assert pool.stats()['waits'] == 2
+    assert pool.stats()['size'] == 2
+
+    pool.release(second)
+    pool.release(third)
+
+
+@pytest.mark.parametrize('compiled', [False, True])
+def test_injector_pooled_scope_supplied(compiled):
+    """Testing leased providers are not acquired for arguments the caller
+    supplies.
+    """
+    injector = Injector()
+    injector.register_callable(dict, 'conn',
+                               scope=Pooled(maxsize=1, timeout=0.05))
+    injector.register_callable(lambda conn: ('session', conn), 'session',
+                               scope='resource')
+
+    @injector.inject('conn', compiled=compiled)
+    def handler(conn, x=0):
+        return conn, x
+
+    @injector.inject('conn', 'session', compiled=compiled)
+    def transaction(conn, session):
+        return conn, session
+
+    pool = injector.scope_of('conn')
+    held, _ = pool.acquire()
+
+    assert handler(conn='mine') == ('mine', 0)
+    assert handler('mine', 1) == ('mine', 1)
+    assert transaction('mine', 'session') == ('mine', 'session')
+
+    with pytest.raises(InjectionError):
+        handler()
+
+    with pytest.raises(InjectionError):
+        transaction(conn='mine')
+
+    pool.release(held)
+
+    assert handler() == ({}, 0)
+    assert transaction(conn='mine') == ('mine', ('session', {}))
+
+
+@pytest.mark.parametrize('compiled', [False, True])
+def test_injector_resource_scope(compiled):
+    """Testing `pyjector.Resource` scope enters generator and context manager
+    providers before the call and finalises them after it, in reverse
+    dependency order, even on errors.
+    """
+    injector = Injector()
+    events = []
+
+    def connection():
+        events.append('connect')
+
+        try:
+            yield 'conn'
+        finally:
+            events.append('close')
+
+    @contextlib.contextmanager
+    def transaction(connection):
+        events.append('begin')
+
+        try:
+            yield connection + ':tx'
+        except ValueError:
+            events.append('rollback')
+            raise
+        else:
+            events.append('commit')
+
+    injector.register_callable(connection, 'connection', scope='resource')
+    injector.register_callable(transaction, 'transaction', scope='resource')
+
+    @injector.inject('transaction', compiled=compiled)
+    def handler(transaction, fail=False):
+        events.append(transaction)
+
+        if fail:
+            raise ValueError(transaction)
+
+        return transaction
+
+    assert handler() == 'conn:tx'
+    assert events == ['connect', 'begin', 'conn:tx', 'commit', 'close']
+
+    del events[:]
+
+    with pytest.raises(ValueError):
+        handler(fail=True)
+
+    assert events == ['connect', 'begin', 'conn:tx', 'rollback', 'close']
+
+    with injector.lease('transaction') as tx:
+        assert tx == 'conn:tx'
+
+    with pytest.raises(InjectionError):
+        injector.get('connection')
+
+
+@pytest.mark.parametrize('compiled', [False, True])
+def test_injector_inject_lazy(compiled):
+    """Testing `pyjector.Injector.inject` lazy dependencies are constructed
+    on first use only.
+    """
+    injector = Injector()
+    built = []
+
+    class Mailer(object):
+        def send(self, message):
+            return 'sent: ' + message
+
+    def make_mailer():
+        built.append(1)
+        return Mailer()
+
+    injector.register_callable(make_mailer, 'mailer', scope='call')
+    injector.register_callable(dict, 'config', scope='call', debug=True)
+
+    @injector.inject(lazy=['mailer'], compiled=compiled)
+    def handler(mailer, config, fail=False):
+        if fail:
+            return mailer.send('error'), mailer.send('again')
+
+        return config['debug']
+
+    assert handler() is True
+    assert built == []
+    assert handler(fail=True) == ('sent: error', 'sent: again')
+    assert built == [1]
+
+    with pytest.raises(InjectionError):
+        injector.inject('config', lazy=['mailer'])
+
+
+def test_injector_freeze():
+    """Testing `pyjector.Injector.freeze` returns a read-only injector
+    sharing the provider instances.
+    """
+    parent = Injector()
+    parent['name'] = 'pyjector'
+    injector = parent.child()
+    injector.register_callable(dict, 'config', scope='singleton', debug=True)
+    config = injector.get('config')
+
+    frozen = injector.freeze()
+
+    assert frozen.frozen and not injector.frozen
+    assert sorted(frozen.api) == ['config', 'name']
+    assert frozen['name'] == 'pyjector'
+    assert frozen.get('config') is config
+    assert 'pyjector' in frozen
+    assert list(frozen.dependency_order()) == ['config']
+
+    with pytest.raises(InjectionError):
+        frozen['other'] = 1
+
+    with pytest.raises(InjectionError):
+        del frozen['name']
+
+    with pytest.raises(InjectionError):
+        frozen.register_callable(list, 'items')
+
+    @frozen.inject()
+    def handler(name, config, x):
+        return name, config, x
+
+    assert handler(x=1) == ('pyjector', config, 1)
+
+    injector['name'] = 'changed'
+    assert handler(x=2) == ('pyjector', config, 2)
+
+
+def test_injector_freeze_provider_dependencies():
+    """Testing the providers of a frozen injector resolve their dependencies
+    from the frozen registry.
+    """
+    injector = Injector()
+    injector['dsn'] = 'old'
+    injector.register_callable(lambda dsn: ('db', dsn), 'db', scope='call')
+
+    frozen = injector.freeze()
+
+    @frozen.inject()
+    def handler(db):
+        return db
+
+    injector['dsn'] = 'new'
+    assert injector.get('db') == ('db', 'new')
+    assert frozen.get('db') == ('db', 'old')
+    assert handler() == ('db', 'old')
+
+    del injector['dsn']
+    assert frozen.get('db') == ('db', 'old')
+    assert handler() == ('db', 'old')
+
+
+def test_injector_register_threads_stress():
+    """Testing `pyjector.Injector.register_callable` from many threads loses
+    and duplicates no registration, while injected calls keep working.
+    """
+    injector = Injector()
+    injector['name'] = 'pyjector'
+    barrier = threading.Barrier(8)
+    winners, errors, stop = [], [], threading.Event()
+
+    @injector.inject('name')
+    def handler(name):
+        return name
+
+    def register(worker):
+        barrier.wait()
+
+        for i in range(50):
+            injector.register_callable(dict, 'w{}_{}'.format(worker, i),
+                                       scope='singleton')
+
+        try:
+            injector.register_callable(list, 'shared', scope='call')
+            winners.append(worker)
+        except InjectionError:
+            pass
+
+    def read():
+        while not stop.is_set():
+            if handler() != 'pyjector':
+                errors.append('bad read')
+
+            try:
+                len(injector.api)
+            except RuntimeError as error:
+                errors.append(error)
+
+    reader = threading.Thread(target=read)
+    reader.start()
+    threads = [threading.Thread(target=register, args=(worker,))
+               for worker in range(8)]
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    stop.set()
+    reader.join()
+
+    assert errors == []
+    assert len(winners) == 1
+    assert len(injector.api) == 8 * 50 + 2
+    assert len(injector.dependency_order()) == 8 * 50 + 1
+
+
+def test_injector_snapshot_rollback():
+    """Testing `pyjector.Injector.rollback` restores a registry recorded by
+    `pyjector.Injector.snapshot`, leaving in-flight calls untouched.
+    """
+    injector = Injector()
+    injector['name'] = 'pyjector'
+    injector.register_callable(dict, 'credentials', scope='singleton',
+                               token='old')
+    old = injector.get('credentials')
+    generation = injector.snapshot()
+
+    @injector.inject('credentials')
+    def handler(credentials, rotate=False):
+        if rotate:
+            del injector['credentials']
+            injector.register_callable(dict, 'credentials', scope='singleton',
+                                       token='bad')
+
+        return credentials['token']
+
+    assert handler(rotate=True) == 'old'
+    assert handler() == 'bad'
+    del injector['name']
+
+    injector.rollback(generation)
+
+    assert injector.generation != generation
+    assert injector.get('credentials') is old
+    assert injector.keyword_of('pyjector') == 'name'
+    assert injector['name'] == 'pyjector'
+    assert handler() == 'old'
+
+    injector.rollback(generation)
+    assert handler() == 'old'
+
+    with pytest.raises(InjectionError):
+        injector.rollback(generation + 100)
+
+    with pytest.raises(InjectionError):
+        injector.freeze().rollback(generation)
+
+
+@pytest.mark.parametrize('compiled', [False, True])
+def test_injector_inject_positional(compiled):
+    """Testing `pyjector.Injector.inject` injects the arguments the caller
+    does not supply, positionally or by keyword.
+    """
+    injector = Injector()
+    injector['name'] = 'pyjector'
+    injector.register_callable(dict, 'config', scope='call', debug=True)
+    injector.register_callable(
+        lambda: (yield 'conn'), 'connection', scope='resource')
+
+    @injector.inject(compiled=compiled)
+    def handler(name, config, x, connection=None, *rest, **extra):
+        return name, config['debug'], x, connection, rest, extra
+
+    assert handler(x=1) == ('pyjector', True, 1, 'conn', (), {})
+    assert handler('other', x=1) == ('other', True, 1, 'conn', (), {})
+    assert handler('other', {'debug': False}, 1) == \
+        ('other', False, 1, 'conn', (), {})
+    assert handler('other', {'debug': False}, 1, 'mine', 2) == \
+        ('other', False, 1, 'mine', (2,), {})
+    assert handler(config={'debug': 0}, x=1, y=2) == \
+        ('pyjector', 0, 1, 'conn', (), {'y': 2})
+    assert handler(name='other', x=1, connection='mine') == \
+        ('other', True, 1, 'mine', (), {})
+
+    def pair(name, config):
+        return name, config['debug']
+
+    stacked = injector.inject('config', compiled=compiled)(
+        injector.inject('name')(pair))
+
+    assert stacked() == ('pyjector', True)
+    assert stacked('other') == ('other', True)
+
+    class Service(object):
+        @injector.inject('name', compiled=compiled)
+        def greet(self, name, greeting='hello'):
+            return '{} {}'.format(greeting, name)
+
+    assert Service().greet() == 'hello pyjector'
+    assert Service().greet('you') == 'hello you'
+    assert Service().greet(greeting='hey') == 'hey pyjector'
+
+
+@pytest.mark.parametrize('compiled', [False, True])
+def test_injector_inject_map(compiled):
+    """Testing `pyjector.Injector.inject` wrappers `map` method resolves the
+    dependencies once per chunk.
+    """
+    injector = Injector()
+    built, events = [], []
+    injector['factor'] = 10
+
+    def make_counter():
+        built.append(1)
+        return len(built)
+
+    def connect():
+        events.append('open')
+        yield 'conn'
+        events.append('close')
+
+    injector.register_callable(make_counter, 'counter', scope='call')
+    injector.register_callable(connect, 'connection', scope='resource')
+
+    @injector.inject(compiled=compiled)
+    def handler(x, factor, counter, connection, y=0):
+        return x * factor + y, counter, connection
+
+    rows = iter([(i,) for i in range(5)] + [(5, 1)])
+    results = handler.map(rows, chunksize=4)
+
+    assert next(results) == (0, 1, 'conn')
+    assert list(results) == [(10, 1, 'conn'), (20, 1, 'conn'),
+                             (30, 1, 'conn'), (40, 2, 'conn'),
+                             (5, 2, 'conn')]
+    assert events == ['open', 'close'] * 2
+
+    with ThreadPoolExecutor(2) as executor:
+        results = list(handler.map(([i] for i in range(100)), chunksize=10,
+                                   executor=executor, prefetch=3))
+
+    assert [result[0] for result in results] == \
+        [i * 10 for i in range(100)]
+    assert len(set(result[1] for result in results)) == 10
+
+    assert list(injector.batch_call(lambda x, factor: x + factor,
+                                    [(1,), (2,)])) == [11, 12]
+    assert list(injector.batch_call(lambda x: -x, [(1,), (2,)])) == [-1, -2]
+    assert list(injector.batch_call(handler, [])) == []
+
+
+def test_injector_pickle():
+    """Testing named `pyjector.Injector` instances pickle by reference, so
+    that injected functions can run in process pools.
+    """
+    injector = Injector(name='test_injector_pickle')
+    injector['prefix'] = '> '
+
+    assert injector.name == 'test_injector_pickle'
+    assert pickle.loads(pickle.dumps(injector)) is injector
+
+    with pytest.raises(TypeError):
+        pickle.dumps(Injector())
+
+    with ProcessPoolExecutor(2) as executor:
+        results = list(injector.batch_call(
+            textwrap.indent, [('a\n',), ('b\n', '- ')], chunksize=1,
+            executor=executor
+        ))
+
+    assert results == ['> a\n', '- b\n']
+
+    dumped = pickle.dumps(Injector(name='test_injector_pickle_gone'))
+    gc.collect()
+
+    with pytest.raises(InjectionError):
+        pickle.loads(dumped)
+
+
+def test_injector_pickle_injected_functions(tmp_path, monkeypatch):
+    """Testing injected functions pickle by reference, by name or by
+    injector name and keywords, so that they can be submitted to process
+    pools.
+    """
+    tmp_path.joinpath('pj_pickled.py').write_text(
+        'from pyjector import Injector\n'
+        '\n'
+        'app = Injector(name="pj_pickled")\n'
+        'app["prefix"] = "> "\n'
+        '\n'
+        'def raw(text, prefix):\n'
+        '    return prefix + text\n'
+        '\n'
+        'def bound(text, prefix):\n'
+        '    return prefix + text\n'
+        '\n'
+        'bound = app.inject("prefix")(bound)\n'
+    )
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.delitem(sys.modules, 'pj_pickled', raising=False)
+    module = __import__('pj_pickled')
+    wrapped = module.app.inject('prefix')(module.raw)
+
+    assert wrapped('a') == '> a'
+    assert pickle.loads(pickle.dumps(wrapped))('a') == '> a'
+    assert pickle.loads(pickle.dumps(module.bound)) is module.bound
+
+    with ProcessPoolExecutor(1) as executor:
+        assert executor.submit(wrapped, 'a').result() == '> a'
+        assert executor.submit(module.bound, 'b').result() == '> b'
+        assert list(executor.map(wrapped, ['c', 'd'])) == ['> c', '> d']
+
+
+@pytest.mark.skipif(not hasattr(os, 'register_at_fork'),
+                    reason='requires os.register_at_fork')
+def test_injector_fork_unsafe():
+    """Testing fork-unsafe providers, and the providers depending on them,
+    are constructed again in child processes after a fork.
+    """
+    injector = Injector()
+    injector.register_callable(object, 'config', scope='singleton')
+    injector.register_callable(object, 'socket',
+                               scope=Singleton(fork_safe=False))
+    injector.register_callable(lambda socket: [socket], 'client',
+                               scope='singleton')
+
+    assert injector.fork_unsafe() == frozenset(['socket', 'client'])
+    assert sorted(injector.warm_up(fork_safe=True)) == ['config']
+
+    config, socket = injector.get('config'), injector.get('socket')
+    client = injector.get('client')
+    read, write = os.pipe()
+    pid = os.fork()
+
+    if pid == 0:  # pragma: no cover
+        try:
+            same = (injector.get('config') is config,
+                    injector.get('socket') is socket,
+                    injector.get('client') is client,
+                    injector.get('client')[0] is injector.get('socket'))
+            os.write(write, repr(same).encode())
+        finally:
+            os._exit(0)
+
+    os.close(write)
+    os.waitpid(pid, 0)
+
+    with os.fdopen(read) as output:
+        assert output.read() == repr((True, False, False, True))
+
+    assert injector.get('socket') is socket
+
+
+@pytest.mark.skipif(not hasattr(os, 'register_at_fork'),
+                    reason='requires os.register_at_fork')
+def test_injector_fork_locks():
+    """Testing the locks of import strings and compiled wrappers, which may
+    be held by other threads at fork time, are recreated in child processes.
+    """
+    injector = Injector()
+    injector.register_callable('os.path:join', 'join')
+    injector['name'] = 'pyjector'
+
+    @injector.inject('name', compiled=True)
+    def handler(name):
+        return name
+
+    locks = [injector['join']._lock, handler.__globals__['_pj_lock']]
+
+    for lock in locks:
+        lock.acquire()
+
+    read, write = os.pipe()
+    pid = os.fork()
+
+    if pid == 0:  # pragma: no cover
+        try:
+            injector['name'] = 'child'
+            result = (injector['join']('a', 'b'), handler())
+            os.write(write, repr(result).encode())
+        finally:
+            os._exit(0)
+
+    for lock in locks:
+        lock.release()
+
+    os.close(write)
+    os.waitpid(pid, 0)
+
+    with os.fdopen(read) as output:
+        assert output.read() == repr((os.path.join('a', 'b'), 'child'))
+
+
+def test_injector_cached_scope(monkeypatch):
+    """Testing `pyjector.Cached` scope expires, evicts and refreshes its
+    instances ahead of expiry.
+    """
+    now = [0.0]
+    monkeypatch.setattr(Cached, 'clock', staticmethod(lambda: now[0]))
+    injector = Injector()
+    built, refreshed = [], threading.Event()
+
+    def make_token(region='eu'):
+        built.append(region)
+
+        if len(built) == 4:
+            refreshed.set()
+
+        return '{}-{}'.format(region, len(built))
+
+    injector.register_callable(make_token, 'token',
+                               scope=Cached(ttl=10, maxsize=2,
+                                            refresh_ahead=2))
+    provider = injector.scope_of('token')
+
+    assert injector.get('token') == 'eu-1'
+    now[0] = 5
+    assert injector.get('token') == 'eu-1'
+    now[0] = 11
+    assert injector.get('token') == 'eu-2'
+
+    assert provider.get(region='us') == 'us-3'
+    assert provider.get(region='us') == 'us-3'
+
+    now[0] = 19.5
+    assert injector.get('token') == 'eu-2'
+    assert refreshed.wait(5)
+
+    for _ in range(100):
+        if injector.get('token') == 'eu-4':
+            break
+
+        threading.Event().wait(0.01)
+
+    assert injector.get('token') == 'eu-4'
+
+    assert provider.get(region='ap') == 'ap-5'
+    assert provider.get(region='us') == 'us-6'
+
+    stats = provider.stats()
+    assert stats.pop('hits') >= 5
+    assert stats == {'size': 2, 'misses': 5, 'evictions': 2, 'refreshes': 1}
+
+
+def test_injector_cached_scope_threads(monkeypatch):
+    """Testing `pyjector.Cached` scope constructs a missing or expired
+    instance once under concurrent use, sharing its result or error.
+    """
+    now = [0.0]
+    monkeypatch.setattr(Cached, 'clock', staticmethod(lambda: now[0]))
+    injector = Injector()
+    built = []
+
+    def fetch_token():
+        built.append(1)
+        time.sleep(0.1)
+
+        if len(built) == 3:
+            raise ValueError('unavailable')
+
+        return 'token-{}'.format(len(built))
+
+    injector.register_callable(fetch_token, 'token', scope=Cached(ttl=10))
+
+    def _run():
+        results = []
+
+        def _get():
+            try:
+                results.append(injector.get('token'))
+            except ValueError as error:
+                results.append(error)
+
+        threads = [threading.Thread(target=_get) for _ in range(8)]
+
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        return results
+
+    assert _run() == ['token-1'] * 8
+    now[0] = 11
+    assert _run() == ['token-2'] * 8
+    now[0] = 22
+    errors = _run()
+    assert len(set(map(id, errors))) == 1
+    assert isinstance(errors[0], ValueError)
+    assert injector.get('token') == 'token-4'
+    assert len(built) == 4
+
+
+def test_injector_get_parameterised(monkeypatch):
+    """Testing `pyjector.Injector.get` with provider arguments memoises the
+    instances per argument set.
+    """
+    monkeypatch.setattr(Singleton, 'maxvariants', 2)
+    injector = Injector()
+    built = []
+    injector['dsn'] = 'db://'
+
+    def connect(dsn, shard=0, readonly=False):
+        built.append(shard)
+        return (dsn, shard, readonly)
+
+    injector.register_callable(connect, 'db', scope='singleton',
+                               readonly=True)
+    injector.register_callable(connect, 'session', scope='call')
+    injector.register_callable(dict, 'local', scope='thread')
+
+    assert injector.get('db') == ('db://', 0, True)
+    assert injector.get('db', shard=3) == ('db://', 3, True)
+    assert injector.get('db', shard=3) is injector.get('db', shard=3)
+    assert injector.get('db', shard=1, readonly=False) == \
+        ('db://', 1, False)
+    assert built == [0, 3, 1]
+
+    injector.get('db', shard=4)
+    injector.get('db', shard=3)
+    assert built == [0, 3, 1, 4, 3]
+    assert injector.get('db') is injector.get('db')
+
+    assert injector.get('session', shard=5) == ('db://', 5, False)
+    assert injector.get('session', shard=5) is not \
+        injector.get('session', shard=5)
+
+    with pytest.raises(InjectionError):
+        injector.get('local', shard=1)
+
+    with pytest.raises(InjectionError):
+        injector.get('dsn', shard=1)
+
+
+def test_injector_get_parameterised_threads():
+    """Testing `pyjector.Singleton` scope constructs a single instance per
+    argument set under concurrent first use.
+    """
+    injector = Injector()
+    built = []
+
+    def connect(shard=0):
+        built.append(shard)
+        time.sleep(0.05)
+        return object()
+
+    injector.register_callable(connect, 'db', scope='singleton')
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(
+        injector.get('db', shard=3))) for _ in range(8)]
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    assert built == [3]
+    assert len(set(map(id, results))) == 1
+
+
+@pytest.mark.parametrize('compiled', [False, True])
+def test_injector_validate_compile_all(compiled):
+    """Testing `pyjector.Injector.validate` reports every invalid injection
+    at once, and `pyjector.Injector.compile_all` prepares the plans.
+    """
+    injector = Injector()
+    injector['name'] = 'pyjector'
+
+    def connect(dsn, timeout=1):
+        return dsn, timeout
+
+    injector.register_callable(connect, 'db', scope='singleton')
+    injector.register_callable(str, 'client', scope='singleton')
+
+    @injector.inject('name', 'db', compiled=compiled)
+    def handler(name, db):
+        return name, db
+
+    @injector.inject('name', 'client', compiled=compiled)
+    def fetch(name, client):
+        return name, client
+
+    with pytest.raises(InjectionError) as error:
+        injector.compile_all()
+
+    assert '`db` provider requires unregistered `dsn`' in str(error.value)
+
+    injector['dsn'] = 'db://'
+
+    assert injector.compile_all() == 2
+    assert handler() == ('pyjector', ('db://', 1))
+
+    del injector['name']
+
+    with pytest.raises(InjectionError) as error:
+        injector.validate()
+
+    assert 'handler depends on unregistered `name`' in str(error.value)
+
+
+def test_injector_compile_all_stacked():
+    """Testing `pyjector.Injector.compile_all` prepares every one of stacked
+    compiled wrappers.
+    """
+    injector = Injector()
+    injector['a'], injector['b'] = 1, 2
+
+    def handler(a, b):
+        return a, b
+
+    inner = injector.inject('a', compiled=True)(handler)
+    outer = injector.inject('b', compiled=True)(inner)
+
+    assert outer._pj_prepare is not inner._pj_prepare
+    assert injector.compile_all() == 2
+
+
+def test_injector_register_import_string(tmp_path, monkeypatch):
+    """Testing `pyjector.Injector.register_callable` with import strings
+    imports the objects on first use only.
+    """
+    tmp_path.joinpath('pj_lazy_db.py').write_text(
+        'def make_engine(dsn, echo=False):\n'
+        '    return {"dsn": dsn, "echo": echo}\n'
+        '\n'
+        'def quote(value):\n'
+        '    return repr(value)\n'
+    )
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.delitem(sys.modules, 'pj_lazy_db', raising=False)
+
+    injector = Injector()
+    injector.register_callable('pj_lazy_db:make_engine', 'engine',
+                               scope='singleton', echo=True)
+    injector.register_callable('pj_lazy_db.quote')
+    injector.register_callable('pj_lazy_db:missing', scope='call')
+    injector['dsn'] = 'db://'
+
+    @injector.inject('engine', 'quote')
+    def handler(engine, quote):
+        return quote(engine['dsn']), engine['echo']
+
+    assert sorted(injector.api) == ['dsn', 'engine', 'missing', 'quote']
+    injector.validate()
+    assert 'pj_lazy_db' not in sys.modules
+
+    assert handler() == ("'db://'", True)
+    assert 'pj_lazy_db' in sys.modules
+    assert injector.get('engine') is injector.get('engine')
+    assert injector.dependencies('engine') == ('dsn',)
+
+    with pytest.raises(InjectionError):
+        injector.get('missing')